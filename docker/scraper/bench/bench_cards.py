@@ -0,0 +1,102 @@
+"""
+Micro-benchmark de l'extraction des cartes Google Maps.
+
+    python -m bench.bench_cards --cards 500 --repeat 20
+
+Compare l'extraction en une passe (selectolax) à l'ancienne extraction
+carte par carte via les sélecteurs scrapling, si scrapling est installé.
+"""
+import argparse
+import re
+import time
+
+from bench.fixtures import maps_results_page
+from scrapers.googlemaps import extract_cards
+
+
+def _css_first(node, selector):
+    # scrapling >= 0.3 n'a plus css_first() et renvoie des Selector pour ::text/::attr
+    if hasattr(node, "css_first"):
+        return node.css_first(selector)
+    found = node.css(selector).first
+    return found.get() if found is not None else None
+
+
+def extract_cards_legacy(html):
+    """Ancienne extraction : plusieurs requêtes CSS par carte et parcours de tous les span"""
+    try:
+        from scrapling.parser import Selector
+    except ImportError:
+        from scrapling import Adaptor as Selector
+
+    page = Selector(html)
+    restaurants = []
+    for card in page.css('div.Nv2PK.THOPZb.CpccDe'):
+        name_el = _css_first(card, 'div.qBF1Pd::text')
+        href = _css_first(card, 'a.hfpxzc::attr(href)')
+        rating_el = _css_first(card, 'span.MW4etd::text')
+        review_el = _css_first(card, 'span.UY7F9::text')
+        price_range = None
+        for span in card.css('span'):
+            txt = span.text.strip()
+            if txt.startswith('MAD'):
+                price_range = txt
+                break
+        cuisine_el = _css_first(card, 'div.W4Efsd > div.W4Efsd span span::text')
+        lat, lng = None, None
+        if href:
+            m = re.search(r'!3d([-\d\.]+)!4d([-\d\.]+)', href)
+            if m:
+                lat, lng = m.group(1), m.group(2)
+        restaurants.append({
+            'name': str(name_el).strip() if name_el else None,
+            'rating': str(rating_el).strip() if rating_el else None,
+            'review_count': str(review_el).strip().strip('()') if review_el else None,
+            'cuisine': str(cuisine_el).strip() if cuisine_el else None,
+            'price_range': price_range,
+            'latitude': lat,
+            'longitude': lng,
+        })
+    return restaurants
+
+
+def timeit(func, html, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction des cartes Google Maps")
+    parser.add_argument("--cards", type=int, default=200, help="Nombre de cartes dans la page")
+    parser.add_argument("--repeat", type=int, default=10, help="Nombre de répétitions")
+    args = parser.parse_args()
+
+    html = maps_results_page(args.cards)
+    print(f"Page synthétique : {args.cards} cartes, {len(html) / 1024:.0f} Ko")
+
+    best, mean, cards = timeit(extract_cards, html, args.repeat)
+    print(f"une passe (selectolax) : min {best * 1000:8.2f} ms  moy {mean * 1000:8.2f} ms  ({len(cards)} cartes)")
+
+    try:
+        best_legacy, mean_legacy, legacy = timeit(extract_cards_legacy, html, args.repeat)
+    except ImportError:
+        print("scrapling non installé : comparaison avec l'ancienne extraction ignorée")
+        return
+    print(f"carte par carte (scrapling) : min {best_legacy * 1000:8.2f} ms  moy {mean_legacy * 1000:8.2f} ms  ({len(legacy)} cartes)")
+    print(f"accélération : x{best_legacy / best:.1f}")
+
+    fields = ("name", "rating", "review_count", "cuisine", "price_range", "latitude", "longitude")
+    mismatches = sum(
+        1 for new, old in zip(cards, legacy)
+        if any(new[field] != old[field] for field in fields)
+    )
+    if mismatches:
+        print(f"⚠️ {mismatches} cartes diffèrent entre les deux extractions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Fixtures HTML/HTTP pour les benchmarks hors ligne : réponses de
+bench/fixtures/ et pages Maps synthétiques. Les fixtures livrées sont écrites
+à la main sur le modèle des vraies réponses (mêmes sélecteurs et formats) ;
+bench/record.py les remplace par des réponses réelles.
+"""
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CUISINES = ["Restaurant", "Cafe", "Moroccan restaurant", "Pizza restaurant", "Seafood restaurant"]
+PRICES = ["MAD 1–50", "MAD 50–100", "MAD 100–200", None]
+
+
+def maps_card(i, rng):
+    """Carte de résultat au format du flux Google Maps"""
+    lat = 35.5 + rng.random() / 10
+    lng = -5.4 + rng.random() / 10
+    price = rng.choice(PRICES)
+    price_html = (
+        f'<span class="e4rVHe"><span><span aria-label="Price">{price}</span></span></span>'
+        if price else ""
+    )
+    return (
+        '<div class="Nv2PK THOPZb CpccDe" role="article">'
+        f'<a class="hfpxzc" aria-label="Restaurant {i}" '
+        f'href="https://www.google.com/maps/place/Restaurant+{i}/data=!4m7!3m6!1s0xd0b42{i:05x}:0x{i:08x}'
+        f'!8m2!3d{lat:.7f}!4d{lng:.7f}!16s%2Fg%2F11c{i}"></a>'
+        '<div class="bfdHYd Ppzolf OFBs3e"><div class="lI9IFe"><div class="y7PRA">'
+        f'<div class="qBF1Pd fontHeadlineSmall">Restaurant {i}</div>'
+        '<div class="W4Efsd"><div class="AJB7ye">'
+        f'<span class="ZkP5Je"><span class="MW4etd">{rng.randint(30, 50) / 10}</span>'
+        f'<span class="UY7F9">({rng.randint(1, 2000)})</span></span>'
+        f'{price_html}</div></div>'
+        '<div class="W4Efsd"><div class="W4Efsd">'
+        f'<span><span>{rng.choice(CUISINES)}</span></span><span> · </span>'
+        f'<span><span>Avenue {i}</span></span></div>'
+        '<div class="W4Efsd"><span><span>Ouvert</span></span></div></div>'
+        '</div></div></div></div>'
+    )
+
+
+def maps_results_page(n_cards=200, seed=42):
+    """Page de résultats Google Maps synthétique contenant `n_cards` cartes"""
+    rng = random.Random(seed)
+    cards = "".join(maps_card(i, rng) for i in range(n_cards))
+    return (
+        "<!DOCTYPE html><html><head><title>restaurant Tetouan - Google Maps</title></head>"
+        f'<body><div role="feed">{cards}</div></body></html>'
+    )
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIR, name)
+
+
+def load_fixture(name):
+    """Retourne le contenu d'une fixture de bench/fixtures/"""
+    with open(fixture_path(name), encoding="utf-8") as f:
+        return f.read()
+
+
+def load_json_fixture(name):
+    return json.loads(load_fixture(name))
+
+
+def maps_fixture(n_cards=200):
+    """Page Maps enregistrée par bench/record.py (maps_results.html) si présente, sinon page synthétique"""
+    if os.path.exists(fixture_path("maps_results.html")):
+        return load_fixture("maps_results.html")
+    return maps_results_page(n_cards)
@@ -0,0 +1,65 @@
+"""
+Enregistre des réponses réelles comme fixtures des benchmarks hors ligne.
+
+    python -m bench.record --ville Tetouan
+
+Écrit dans bench/fixtures/ : la page de résultats Maps (après défilement),
+la page de recherche Google du premier restaurant et la réponse Nominatim
+correspondante.
+"""
+import argparse
+import json
+import logging
+
+from bench.fixtures import fixture_path
+from utils.browser_pool import close_browser_pool, get_browser_pool
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enregistrement des fixtures de benchmark")
+    parser.add_argument("--ville", default="Tetouan", help="Ville dont la recherche Maps est enregistrée")
+    args = parser.parse_args()
+
+    from scrapers import googlemaps
+
+    try:
+        metrics = googlemaps.ScrollMetrics()
+        page = get_browser_pool().fetch(
+            f"https://www.google.com/maps/search/restaurant+{args.ville}/",
+            disable_resources=True,
+            network_idle=True,
+            page_action=lambda p: googlemaps.load_all_results(p, metrics),
+            timeout=90000,
+        )
+        with open(fixture_path("maps_results.html"), "w", encoding="utf-8") as f:
+            f.write(page.html_content)
+
+        cards = [card for card in googlemaps.extract_cards(page.html_content) if card["name"]]
+        logging.info(f"{len(cards)} cartes enregistrées ({metrics})")
+        if not cards:
+            return
+        first = cards[0]
+
+        query = first["name"].replace(" ", "+")
+        search = get_browser_pool().fetch(f"https://www.google.com/search?q={query}", network_idle=True)
+        with open(fixture_path("google_search.html"), "w", encoding="utf-8") as f:
+            f.write(search.html_content)
+
+        if first["latitude"] and first["longitude"]:
+            from utils.http import get_http_session
+            resp = get_http_session("nominatim", headers=googlemaps.NOMINATIM_HEADERS).get(
+                googlemaps.NOMINATIM_URL,
+                params={"format": "json", "lat": first["latitude"], "lon": first["longitude"],
+                        "zoom": 16, "addressdetails": 1},
+                timeout=10,
+            )
+            with open(fixture_path("nominatim_reverse.json"), "w", encoding="utf-8") as f:
+                json.dump(resp.json(), f, ensure_ascii=False, indent=2)
+    finally:
+        close_browser_pool()
+
+
+if __name__ == "__main__":
+    main()
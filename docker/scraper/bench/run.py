@@ -0,0 +1,281 @@
+"""
+Benchmark hors ligne du pipeline de scraping.
+
+    python -m bench.run --cards 200
+    python -m bench.run --save-baseline     # enregistre bench/baseline.json
+    python -m bench.run --check             # code de sortie 1 si un étage régresse ou sans référence
+
+Rejoue les fixtures de bench/fixtures/ (page de recherche Google et réponse
+Nominatim écrites à la main d'après les vraies, page Maps synthétique ; voir
+bench/record.py pour les remplacer par des réponses réelles) à travers des substituts locaux du pool de navigateurs, de la
+session HTTP Nominatim et du broker Kafka, puis mesure chaque étage :
+débit et latences p50/p95.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Caches, compteur et limiteurs isolés de ceux du scraper, avant tout import du projet
+_workdir = tempfile.mkdtemp(prefix="scraper-bench-")
+os.environ["GEOCODE_CACHE_PATH"] = os.path.join(_workdir, "geocode.sqlite")
+os.environ["ENRICH_CACHE_PATH"] = os.path.join(_workdir, "enrichment.sqlite")
+os.environ["ID_COUNTER_FILE"] = os.path.join(_workdir, "counter.txt")
+os.environ["NOMINATIM_RATE"] = "0"
+
+import kafka as kafka_client  # noqa: E402
+from bench.fixtures import load_fixture, load_json_fixture, maps_fixture  # noqa: E402
+from scrapers import googlemaps  # noqa: E402
+from utils import parser as item_parser  # noqa: E402
+from utils import record  # noqa: E402
+from utils import sender  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Stage:
+    """Mesures d'un étage : une durée par opération et le nombre d'éléments traités"""
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = []
+        self.items = 0
+        self.skipped = None
+
+    def measure(self, func, *args, items=1):
+        start = time.perf_counter()
+        result = func(*args)
+        self.timings.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def summary(self):
+        total = sum(self.timings)
+        return {
+            "ops": len(self.timings),
+            "items": self.items,
+            "throughput": self.items / total if total else 0.0,
+            "p50_ms": percentile(self.timings, 50) * 1000,
+            "p95_ms": percentile(self.timings, 95) * 1000,
+        }
+
+
+def make_page(html):
+    """Page scrapling construite à partir du HTML de la fixture"""
+    try:
+        from scrapling.parser import Adaptor as Page
+    except ImportError:
+        from scrapling.parser import Selector as Page
+    return Page(html)
+
+
+class StandInBrowserPool:
+    """Substitut du pool de navigateurs : renvoie les pages des fixtures"""
+
+    def __init__(self, maps_html, search_html):
+        self.maps_html = maps_html
+        self.search_html = search_html
+
+    def fetch(self, url, **fetch_options):
+        return make_page(self.maps_html if "/maps/" in url else self.search_html)
+
+    def stats(self):
+        return {}
+
+
+class StandInResponse:
+    def __init__(self, url, body):
+        self.url = url
+        self.text = body
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class StandInSession:
+    """Substitut des sessions HTTP (Nominatim, recherche Google) : rejoue la réponse de la fixture"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, url, params=None, timeout=None):
+        return StandInResponse(url, self.body)
+
+
+class FakeFuture:
+    def __init__(self):
+        self._callbacks = []
+
+    def add_callback(self, func, *args):
+        self._callbacks.append((func, args))
+        return self
+
+    def add_errback(self, func, *args):
+        return self
+
+    def resolve(self):
+        for func, args in self._callbacks:
+            func(*args, None)
+
+
+class FakeProducer:
+    """Broker Kafka factice : sérialise les messages et les acquitte au flush"""
+
+    def __init__(self, value_serializer=None, **options):
+        self.value_serializer = value_serializer or (lambda v: v)
+        self.pending = []
+        self.bytes_sent = 0
+
+    def send(self, topic, value):
+        self.bytes_sent += len(self.value_serializer(value))
+        future = FakeFuture()
+        self.pending.append(future)
+        return future
+
+    def flush(self, timeout=None):
+        for future in self.pending:
+            future.resolve()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+
+def run(n_cards, repeat):
+    maps_html = maps_fixture(n_cards)
+    search_html = load_fixture("google_search.html")
+    nominatim = load_json_fixture("nominatim_reverse.json")
+    stages = {}
+
+    # Extraction des cartes
+    stage = stages["extraction"] = Stage("extraction")
+    for _ in range(repeat):
+        cards = stage.measure(googlemaps.extract_cards, maps_html, items=0)
+        stage.items += len(cards)
+
+    # Géocodage : appel Nominatim rejoué + écriture en cache, puis lecture en cache
+    sessions = {"nominatim": StandInSession(json.dumps(nominatim)), "google": StandInSession(search_html)}
+    googlemaps.get_http_session = lambda name="default", **kwargs: sessions[name]
+    stage = stages["geocodage"] = Stage("geocodage")
+    hit_stage = stages["geocodage_cache"] = Stage("geocodage_cache")
+    for card in cards:
+        if card["latitude"] and card["longitude"]:
+            card["address"] = stage.measure(googlemaps.fetch_and_cache_geocode, card["latitude"], card["longitude"])
+            hit_stage.measure(googlemaps.reverse_geocode, card["latitude"], card["longitude"])
+
+    # Enrichissement, niveau HTTP : page de recherche de la fixture analysée par selectolax
+    stage = stages["enrichissement_http"] = Stage("enrichissement_http")
+    for card in cards:
+        stage.measure(googlemaps.enrich_restaurant_info, dict(card))
+
+    # Enrichissement, niveau navigateur : même page, servie comme page scrapling
+    googlemaps.get_browser_pool = lambda: StandInBrowserPool(maps_html, search_html)
+    googlemaps.ENRICH_HTTP_TIER = False
+    googlemaps.get_enrichment_cache().clear()
+    stage = stages["enrichissement"] = Stage("enrichissement")
+    try:
+        googlemaps.parse_search_page(make_page(search_html))
+    except ImportError as e:
+        stage.skipped = f"scrapling absent ({e})"
+    else:
+        for card in cards:
+            stage.measure(googlemaps.enrich_restaurant_info, card)
+
+    # Transformation au format de sortie
+    stage = stages["parse_item"] = Stage("parse_item")
+    payloads = []
+    for card in cards:
+        card["city"] = "Bench"
+        payloads.append(stage.measure(item_parser.parse_item, card))
+
+    # Sérialisation JSON (une fois par Record, octets réutilisés par Kafka et les fichiers)
+    stage = stages["serialisation"] = Stage("serialisation")
+    for payload in payloads:
+        stage.measure(record.encode, payload)
+
+    # Envoi Kafka pipeliné vers un broker factice (client kafka importé à la connexion)
+    kafka_client.KafkaProducer = FakeProducer
+    kafka = sender.KafkaSender(pipelined=True)
+    stage = stages["kafka"] = Stage("kafka")
+    for payload in payloads:
+        stage.measure(kafka.send, payload, "Bench")
+    stage.measure(kafka.flush, "Bench", items=0)
+
+    return stages
+
+
+def report(stages):
+    print(f"{'étage':<20} {'ops':>6} {'éléments/s':>12} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for stage in stages.values():
+        if stage.skipped:
+            print(f"{stage.name:<20} ignoré : {stage.skipped}")
+            continue
+        s = stage.summary()
+        print(f"{stage.name:<20} {s['ops']:>6} {s['throughput']:>12.0f} {s['p50_ms']:>10.3f} {s['p95_ms']:>10.3f}")
+
+
+def check_regressions(stages, baseline, tolerance):
+    """Retourne la liste des étages dont le p95 dépasse la référence × tolérance"""
+    regressions = []
+    for name, reference in baseline.items():
+        stage = stages.get(name)
+        if stage is None or stage.skipped:
+            continue
+        p95 = stage.summary()["p95_ms"]
+        if p95 > reference["p95_ms"] * tolerance:
+            regressions.append(f"{name}: p95 {p95:.3f} ms > {reference['p95_ms']:.3f} ms × {tolerance}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline de scraping")
+    parser.add_argument("--cards", type=int, default=200, help="Nombre de cartes de la page Maps synthétique")
+    parser.add_argument("--repeat", type=int, default=5, help="Répétitions de l'extraction des cartes")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme référence")
+    parser.add_argument("--check", action="store_true", help="Compare à la référence et échoue en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Facteur de tolérance sur le p95 de référence")
+    parser.add_argument("--allow-missing-baseline", action="store_true",
+                        help="Avec --check, réussir avec un avertissement si aucune référence n'est enregistrée")
+    args = parser.parse_args()
+
+    stages = run(args.cards, args.repeat)
+    report(stages)
+
+    if args.save_baseline:
+        baseline = {name: stage.summary() for name, stage in stages.items() if not stage.skipped}
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Référence enregistrée dans {BASELINE_FILE}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_FILE):
+            if args.allow_missing_baseline:
+                print("AVERTISSEMENT pas de référence, rien à comparer : lancer d'abord avec --save-baseline")
+                return 0
+            print("Pas de référence : lancer d'abord avec --save-baseline (ou --allow-missing-baseline)")
+            return 1
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check_regressions(stages, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,35 @@
 import importlib
+import threading
+
+# Métadonnées qu'un module scraper peut déclarer dans SCRAPER_INFO
+DEFAULT_SCRAPER_INFO = {
+    "supports_parallel": False,   # accepte use_parallel/max_workers
+    "async": False,               # fournit scrape_async/scrape_stream_async
+    "rate_limits": {},            # débits par défaut par domaine (req/s), surchargés par --domain-rate
+    "url_template": None,         # URL de recherche, {param} remplacé par la ville
+    "tile_url_template": None,    # recherche centrée sur une tuile ({lat}, {lon}, {zoom}) : mode --tiles
+}
+
+# Modules scrapers déjà résolus, par nom
+_scrapers = {}
+_scrapers_lock = threading.Lock()
 
 
 def load_scraper(name: str):
     """
-    Charge dynamiquement le module `scrapers.{name}`.
+    Charge dynamiquement le module `scrapers.{name}`, une seule fois par
+    processus : les appels suivants (une fois par ville) sont une simple lecture.
     """
-    return importlib.import_module(f"scrapers.{name}")
\ No newline at end of file
+    module = _scrapers.get(name)
+    if module is None:
+        with _scrapers_lock:
+            module = _scrapers.get(name)
+            if module is None:
+                module = _scrapers[name] = importlib.import_module(f"scrapers.{name}")
+    return module
+
+
+def scraper_info(name: str) -> dict:
+    """Métadonnées déclarées par le scraper `name`, complétées des valeurs par défaut"""
+    return {**DEFAULT_SCRAPER_INFO, **getattr(load_scraper(name), "SCRAPER_INFO", {})}
+
@@ -1,9 +1,134 @@
-from scrapling.fetchers import StealthyFetcher  # ou StealthyFetcher
+import asyncio
+import inspect
+import queue
+import threading
+from utils.browser_pool import close_async_browser
 
+# Boucle asyncio unique du processus, dans un thread dédié : les coroutines
+# de tous les jobs y sont multiplexées (une page en attente ne bloque rien)
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+_DONE = object()
 
-def run_scraper(module, url: str, **kwargs):
+
+def get_event_loop():
+    """Retourne la boucle asyncio partagée, en la démarrant si nécessaire"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="scraper-asyncio", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def submit(coro):
+    """
+    Planifie la coroutine sur la boucle partagée et retourne un Future.
+    La tâche hérite des variables de contexte de l'appelant (job courant).
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_coroutine(coro):
+    """Exécute la coroutine sur la boucle partagée et attend son résultat"""
+    return submit(coro).result()
+
+
+def iter_async(agen):
+    """Itère de façon synchrone sur un générateur asynchrone exécuté dans la boucle partagée"""
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        finally:
+            items.put(_DONE)
+
+    future = submit(pump())
+    try:
+        while (item := items.get()) is not _DONE:
+            yield item
+        future.result()
+    finally:
+        # Consommateur interrompu : arrêter le générateur
+        future.cancel()
+
+
+def close_event_loop():
+    """Ferme le navigateur asynchrone puis arrête la boucle partagée"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        loop, thread = _loop, _loop_thread
+        _loop = _loop_thread = None
+    if loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(close_async_browser(), loop).result(timeout=30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=30)
+    loop.close()
+
+
+def is_async(func) -> bool:
+    return inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func)
+
+
+def accepted_kwargs(func, **kwargs):
+    """Paramètres nommés que `func` accepte, parmi `kwargs`"""
+    parameters = inspect.signature(func).parameters
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values()):
+        return kwargs
+    return {name: value for name, value in kwargs.items() if name in parameters}
+
+
+def iter_results(func, *args, **kwargs):
+    """
+    Appelle `func` (fonction, coroutine ou générateur, synchrone ou
+    asynchrone) avec les paramètres nommés qu'elle accepte et itère sur ses
+    résultats. Les variantes asynchrones s'exécutent dans la boucle partagée.
+    """
+    kwargs = accepted_kwargs(func, **kwargs)
+    if inspect.isasyncgenfunction(func):
+        yield from iter_async(func(*args, **kwargs))
+    elif inspect.iscoroutinefunction(func):
+        yield from run_coroutine(func(*args, **kwargs))
+    else:
+        yield from func(*args, **kwargs)
+
+
+def entry_point(module, stream=False, use_async=False):
+    """
+    Fonction de scraping du module : scrape_stream (en flux) ou scrape, et
+    leurs variantes scrape_stream_async/scrape_async si `use_async`.
+    """
+    names = ("scrape_stream", "scrape") if stream else ("scrape",)
+    if use_async:
+        names = tuple(f"{name}_async" for name in names) + names
+    for name in names:
+        func = getattr(module, name, None)
+        if func is not None:
+            return func
+    raise AttributeError(f"{module.__name__} ne définit pas de fonction scrape")
+
+
+def run_scraper(module, url: str, use_async=False, **kwargs):
     """
     Appelle la fonction scrape(url) du module scraper et renvoie la liste des items.
-    Permet de passer des paramètres supplémentaires à la fonction scrape.
+    Permet de passer des paramètres supplémentaires à la fonction scrape ;
+    ceux qu'elle n'accepte pas sont ignorés. `async def scrape` est exécutée
+    dans la boucle partagée.
+    """
+    scrape = entry_point(module, use_async=use_async)
+    if is_async(scrape):
+        return list(iter_results(scrape, url, **kwargs))
+    return scrape(url, **accepted_kwargs(scrape, **kwargs))
+
+
+def stream_scraper(module, url: str, use_async=False, **kwargs):
+    """
+    Itère sur les items du scraper au fur et à mesure de leur production.
+    Utilise scrape_stream(url) si le module la fournit, sinon la liste de scrape(url).
     """
-    return module.scrape(url, **kwargs)
\ No newline at end of file
+    yield from iter_results(entry_point(module, stream=True, use_async=use_async), url, **kwargs)
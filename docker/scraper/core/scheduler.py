@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+import concurrent.futures
+from core.loader import scraper_info
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Un couple source × ville à scraper, avec son bilan d'exécution"""
+
+    def __init__(self, scraper, url, city, bbox=None):
+        self.scraper = scraper
+        self.url = url
+        self.city = city
+        # Boîte englobante de la ville (villes_maroc.json), pour le mode par tuiles
+        self.bbox = bbox
+        self.status = "en attente"
+        self.count = 0
+        self.duration = 0.0
+        self.error = None
+
+    @property
+    def key(self):
+        """Identifiant stable du job, utilisé par le journal de reprise"""
+        return f"{self.scraper}/{self.city}/{self.url}"
+
+    def __repr__(self):
+        return f"Job(scraper={self.scraper!r}, city={self.city!r}, status={self.status!r})"
+
+
+def build_jobs(sources, villes):
+    """
+    Construit la liste des jobs à partir de sources.json et des villes (noms,
+    ou entrées de villes_maroc.json avec leur "bbox" éventuelle). Une source
+    sans "url" utilise le modèle d'URL déclaré par son scraper.
+    """
+    jobs = []
+    for src in sources:
+        url = src.get("url") or scraper_info(src["scraper"])["url_template"]
+        if "{param}" in url:
+            for ville in villes:
+                if isinstance(ville, str):
+                    ville = {"city": ville}
+                jobs.append(Job(src["scraper"], url.replace("{param}", ville["city"]), ville["city"], ville.get("bbox")))
+        else:
+            jobs.append(Job(src["scraper"], url, "unknown_city"))
+    return jobs
+
+
+def run_jobs(jobs, handler, max_concurrent=1):
+    """
+    Exécute les jobs avec au plus `max_concurrent` jobs simultanés.
+
+    `handler(job)` scrape et traite un job et retourne le nombre d'éléments.
+    Les navigateurs restent plafonnés globalement par le pool partagé
+    (utils.browser_pool) et la politesse par domaine par utils.ratelimit,
+    quel que soit le nombre de jobs en cours.
+    """
+    total = len(jobs)
+    done = 0
+    lock = threading.Lock()
+
+    def run(job):
+        nonlocal done
+        job.status = "en cours"
+        start = time.monotonic()
+        try:
+            job.count = handler(job) or 0
+            job.status = "terminé"
+        except Exception as e:
+            job.status = "échec"
+            job.error = str(e)
+            logger.exception(f"Échec du job {job.scraper}/{job.city}: {e}")
+        finally:
+            job.duration = time.monotonic() - start
+            with lock:
+                done += 1
+                logger.info(
+                    f"[{done}/{total}] {job.scraper}/{job.city} {job.status}: "
+                    f"{job.count} éléments en {job.duration:.1f}s"
+                )
+        return job
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as executor:
+        list(executor.map(run, jobs))
+
+    log_summary(jobs)
+    return jobs
+
+
+def log_summary(jobs):
+    """Affiche le bilan de l'exécution, job par job"""
+    logger.info("Bilan des jobs :")
+    for job in jobs:
+        line = f"  {job.scraper:<12} {job.city:<15} {job.status:<10} {job.count:>5} éléments  {job.duration:>7.1f}s"
+        if job.error:
+            line += f"  ({job.error})"
+        logger.info(line)
+    failed = sum(1 for job in jobs if job.status == "échec")
+    logger.info(
+        f"Total: {sum(job.count for job in jobs)} éléments, "
+        f"{len(jobs) - failed}/{len(jobs)} jobs réussis"
+    )
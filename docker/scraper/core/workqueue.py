@@ -0,0 +1,303 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WORK_QUEUE_TOPIC = os.getenv("WORK_QUEUE_TOPIC", "scraper-jobs")
+WORK_QUEUE_GROUP = os.getenv("WORK_QUEUE_GROUP", "scraper-workers")
+# Durée maximale de traitement d'une tâche avant qu'elle soit redistribuée
+LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+
+TASKS = registry.counter(
+    "scraper_tasks_total", "Tâches de la file de travail traitées", labels=("kind", "status")
+)
+
+
+class Task:
+    """
+    Tâche de la file de travail : un job source × ville (`job`) ou un lot de
+    restaurants à enrichir (`enrich`), avec son nombre de tentatives.
+    """
+
+    def __init__(self, kind, payload, attempts=0, id=None):
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.id = id or uuid.uuid4().hex
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "payload": self.payload, "attempts": self.attempts}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], data["payload"], data.get("attempts", 0), data.get("id"))
+
+    def retry(self):
+        """Copie de la tâche pour une nouvelle tentative"""
+        return Task(self.kind, self.payload, self.attempts + 1, self.id)
+
+    def __repr__(self):
+        return f"Task(kind={self.kind!r}, id={self.id!r}, attempts={self.attempts})"
+
+
+class Lease:
+    """Réservation d'une tâche par un worker, jusqu'à ack() ou nack()"""
+
+    def __init__(self, task, token, expires_at=None):
+        self.task = task
+        self.token = token
+        self.expires_at = expires_at
+
+
+class InMemoryQueue:
+    """
+    File de travail locale (threads d'un même processus), pour les tests et
+    l'exécution sur une seule machine. Une tâche réservée et non acquittée
+    avant l'expiration de son bail est remise en file.
+    """
+
+    def __init__(self, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._tasks = collections.deque()
+        self._leases = {}
+        self._dead = []
+        self._cond = threading.Condition()
+
+    def put(self, task):
+        with self._cond:
+            self._tasks.append(task)
+            self._cond.notify()
+
+    def flush(self):
+        pass
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        for token, lease in list(self._leases.items()):
+            if lease.expires_at <= now:
+                del self._leases[token]
+                logger.warning(f"Bail expiré, tâche remise en file : {lease.task}")
+                self._tasks.append(lease.task.retry())
+
+    def claim(self, timeout=1.0):
+        """Réserve la prochaine tâche, ou retourne None après `timeout` secondes"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._requeue_expired()
+                if self._tasks:
+                    task = self._tasks.popleft()
+                    lease = Lease(task, uuid.uuid4().hex, time.monotonic() + self.lease_seconds)
+                    self._leases[lease.token] = lease
+                    return lease
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, 1.0))
+
+    def ack(self, lease):
+        """Acquitte la tâche ; faux si son bail a expiré entre-temps (tâche remise en file)"""
+        with self._cond:
+            return self._leases.pop(lease.token, None) is not None
+
+    def nack(self, lease):
+        """Libère la tâche : nouvelle tentative, ou abandon au-delà de max_attempts"""
+        with self._cond:
+            if self._leases.pop(lease.token, None) is None:
+                return
+            task = lease.task.retry()
+            if task.attempts >= self.max_attempts:
+                logger.error(f"Tâche abandonnée après {task.attempts} tentatives : {task}")
+                self._dead.append(task)
+            else:
+                self._tasks.append(task)
+                self._cond.notify()
+
+    def pending(self):
+        """Nombre de tâches en file ou réservées (un job en cours peut encore en publier)"""
+        with self._cond:
+            return len(self._tasks) + len(self._leases)
+
+    def close(self):
+        pass
+
+
+class KafkaWorkQueue:
+    """
+    File de travail sur un topic Kafka, partagée par les réplicas du scraper.
+
+    Les workers d'un même groupe de consommateurs se répartissent les
+    partitions ; une tâche est réservée tant que son offset n'est pas validé.
+    Le bail correspond à `max_poll_interval_ms` : un worker qui dépasse ce
+    délai (ou qui meurt) est exclu du groupe et ses tâches non acquittées sont
+    redistribuées. Les tâches en échec sont republiées, puis envoyées sur
+    `<topic>.dlq` au-delà de `max_attempts`.
+
+    Un consommateur Kafka n'étant pas partagé entre threads, chaque thread
+    worker utilise sa propre instance.
+    """
+
+    def __init__(self, bootstrap_servers='kafka:9092', topic=WORK_QUEUE_TOPIC,
+                 group_id=WORK_QUEUE_GROUP, lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.bootstrap_servers = bootstrap_servers
+        self.topic = topic
+        self.group_id = group_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._producer = None
+        self._consumer = None
+
+    def _get_producer(self):
+        if self._producer is None:
+            from kafka import KafkaProducer
+            self._producer = KafkaProducer(
+                bootstrap_servers=self.bootstrap_servers,
+                value_serializer=lambda v: json.dumps(v, ensure_ascii=False).encode('utf-8'),
+                acks='all',
+            )
+        return self._producer
+
+    def _get_consumer(self):
+        if self._consumer is None:
+            from kafka import KafkaConsumer
+            self._consumer = KafkaConsumer(
+                self.topic,
+                bootstrap_servers=self.bootstrap_servers,
+                group_id=self.group_id,
+                enable_auto_commit=False,
+                auto_offset_reset='earliest',
+                max_poll_records=1,
+                max_poll_interval_ms=int(self.lease_seconds * 1000),
+                value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+            )
+        return self._consumer
+
+    def put(self, task, topic=None):
+        self._get_producer().send(topic or self.topic, task.to_dict())
+
+    def flush(self):
+        if self._producer:
+            self._producer.flush()
+
+    def claim(self, timeout=1.0):
+        consumer = self._get_consumer()
+        records = consumer.poll(timeout_ms=int(timeout * 1000), max_records=1)
+        for partition_records in records.values():
+            for record in partition_records:
+                return Lease(Task.from_dict(record.value), (record.topic, record.partition, record.offset))
+        return None
+
+    def ack(self, lease):
+        """
+        Valide l'offset de la tâche. Faux si le bail a été perdu : le worker a
+        été exclu du groupe (rééquilibrage) et la tâche sera redistribuée.
+        """
+        from kafka import TopicPartition
+        from kafka.errors import CommitFailedError
+        from kafka.structs import OffsetAndMetadata
+        topic, partition, offset = lease.token
+        try:
+            position = OffsetAndMetadata(offset + 1, None, -1)
+        except TypeError:
+            # kafka-python < 2.1 : pas de leader_epoch
+            position = OffsetAndMetadata(offset + 1, None)
+        try:
+            self._get_consumer().commit({TopicPartition(topic, partition): position})
+        except CommitFailedError as e:
+            logger.warning(f"Bail perdu, tâche non acquittée (elle sera redistribuée) : {lease.task}: {e}")
+            return False
+        return True
+
+    def pending(self):
+        """
+        Le reste du topic n'est pas visible depuis un worker : l'arrêt sur
+        inactivité ne dépend que de l'absence de tâche à réserver.
+        """
+        return 0
+
+    def nack(self, lease):
+        task = lease.task.retry()
+        if task.attempts >= self.max_attempts:
+            logger.error(f"Tâche abandonnée après {task.attempts} tentatives, envoyée sur {self.topic}.dlq : {task}")
+            self.put(task, topic=f"{self.topic}.dlq")
+        else:
+            self.put(task)
+        self.flush()
+        self.ack(lease)
+
+    def close(self):
+        if self._consumer:
+            self._consumer.close()
+            self._consumer = None
+        if self._producer:
+            self._producer.flush()
+            self._producer.close()
+            self._producer = None
+
+
+def create_queue(backend="kafka", **options):
+    """Crée une file de travail : `kafka` (réplicas) ou `memory` (local)"""
+    if backend == "memory":
+        return InMemoryQueue(**options)
+    if backend == "kafka":
+        return KafkaWorkQueue(**options)
+    raise ValueError(f"File de travail inconnue : {backend}")
+
+
+def run_worker(queue, handlers, idle_timeout=0, stop=None, on_acked=None):
+    """
+    Boucle d'un worker : réserve les tâches, les confie au handler de leur
+    type (`handlers[kind](task)`) puis les acquitte, ou les libère pour une
+    nouvelle tentative en cas d'exception. Une tâche dont le bail a été perdu
+    avant l'acquittement est comptée comme telle et la boucle continue : la
+    file la redistribue. `on_acked(task, result)` est appelé une fois la
+    tâche acquittée, avec la valeur retournée par son handler.
+
+    S'arrête quand `stop` (threading.Event) est levé, ou après
+    `idle_timeout` secondes sans tâche (0 : jamais) tant que la file n'a plus
+    de tâche en attente ni réservée : un job encore en cours chez un autre
+    worker peut publier de nouvelles tâches. Retourne le nombre de tâches
+    traitées avec succès.
+    """
+    done = 0
+    idle_since = time.monotonic()
+    while not (stop and stop.is_set()):
+        lease = queue.claim(timeout=1.0)
+        if lease is None:
+            if queue.pending():
+                idle_since = time.monotonic()
+            elif idle_timeout and time.monotonic() - idle_since >= idle_timeout:
+                logger.info(f"Aucune tâche depuis {idle_timeout:.0f}s, arrêt du worker")
+                break
+            continue
+
+        task = lease.task
+        handler = handlers.get(task.kind)
+        try:
+            if handler is None:
+                raise ValueError(f"Type de tâche inconnu : {task.kind}")
+            result = handler(task)
+        except Exception as e:
+            logger.exception(f"Échec de la tâche {task}: {e}")
+            TASKS.inc(kind=task.kind, status="échec")
+            queue.nack(lease)
+        else:
+            if queue.ack(lease):
+                TASKS.inc(kind=task.kind, status="terminé")
+                done += 1
+                if on_acked:
+                    on_acked(task, result)
+            else:
+                TASKS.inc(kind=task.kind, status="bail perdu")
+        idle_since = time.monotonic()
+    return done
@@ -1,35 +1,258 @@
+import time
+# Début du processus, pour mesurer le coût des imports (--dry-run)
+STARTED = time.perf_counter()
 import json
 import os
 import argparse
-from core.loader import load_scraper
-from core.runner import run_scraper
-from utils.parser import process_city_results
-from utils.sender import close_kafka_sender
+from datetime import date
+from core.loader import load_scraper, scraper_info
+from core.runner import accepted_kwargs, close_event_loop, iter_results, run_scraper, stream_scraper
+from core.scheduler import Job, build_jobs, run_jobs
+from core.workqueue import Task, create_queue, run_worker
+from utils.parser import process_city_results, process_city_stream
+from utils.browser_pool import close_browser_pool, configure_async_browser, configure_browser_pool
+from utils.checkpoint import close_checkpoint, configure_checkpoint, current_job, get_checkpoint
+from utils.dedup import configure_dedup
+from utils.idgen import configure_id_mode
+from utils import metrics
+from utils.ratelimit import configure_domain_rates
+from utils.output import configure_output
+from utils.postprocess import configure_postprocess
+from utils.state import configure_state_store
+from utils.tiles import grid
+from utils.sender import close_sink, configure_sink
 import logging
 import signal
 import sys
+import threading
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
 )
+IMPORTED = time.perf_counter()
 
 # Gestion propre de l'arrêt du programme
 def signal_handler(sig, frame):
     logging.info("Arrêt du scraper...")
-    close_kafka_sender()
+    close_sink()
+    close_event_loop()
+    close_browser_pool()
+    close_checkpoint()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+def scrape_and_process(scraper, info, url, city, args, bbox=None, report_key=None):
+    """
+    Scrape une URL (ou les tuiles de `bbox`) puis traite ses résultats ;
+    retourne le nombre d'éléments. `info` : métadonnées du scraper
+    (scraper_info), `report_key` identifie le job (Job.key) auprès de la
+    destination.
+    """
+    before = metrics.snapshot()
+    try:
+        return _scrape_and_process(scraper, info, url, city, args, bbox, report_key)
+    finally:
+        logging.info(metrics.city_summary(city, before))
+
+def scraper_kwargs(args, info):
+    """Paramètres de parallélisme, pour les scrapers qui déclarent supports_parallel"""
+    if not info["supports_parallel"]:
+        return {}
+    return {"use_parallel": args.parallel, "max_workers": args.workers}
+
+def use_async(args, info):
+    """Variantes asynchrones (--async-pages), pour les scrapers qui déclarent async"""
+    return args.async_pages > 0 and info["async"]
+
+def _scrape_and_process(scraper, info, url, city, args, bbox=None, report_key=None):
+    kwargs = dict(scraper_kwargs(args, info), city=city, use_async=use_async(args, info))
+    if args.tiles and bbox and info["tile_url_template"]:
+        kwargs["bbox"] = bbox
+    
+    if args.stream:
+        # Chaque élément est envoyé et écrit dès qu'il est enrichi
+        return process_city_stream(stream_scraper(scraper, url, **kwargs), city, report_key)
+    
+    items = run_scraper(scraper, url, **kwargs)
+    # Traiter tous les résultats de cette ville en une seule fois
+    process_city_results(items, city, report_key)
+    return len(items)
+
+def enrich_and_process(scraper, info, restaurants, city, args, report_key=None):
+    """Enrichit un lot de restaurants déjà listés puis traite ses résultats"""
+    enrich = (use_async(args, info) and getattr(scraper, "enrich_places_async", None)) or scraper.enrich_places
+    items = iter_results(enrich, restaurants, **scraper_kwargs(args, info))
+    if args.stream:
+        return process_city_stream(items, city, report_key)
+    items = list(items)
+    process_city_results(items, city, report_key)
+    return len(items)
+
+def job_task(job):
+    return Task("job", {"scraper": job.scraper, "url": job.url, "city": job.city, "bbox": job.bbox})
+
+def fanout_job(payload):
+    """Job d'une tâche d'enrichissement, sans ses restaurants ni son numéro de lot"""
+    return Job(**{key: value for key, value in payload.items() if key not in ("restaurants", "batch", "batches")})
+
+def run_queue_workers(args, jobs, handle):
+    """
+    Mode worker : les jobs sont réservés dans la file de travail partagée par
+    les réplicas. Avec --fanout N, un job liste les restaurants de sa ville et
+    publie leur enrichissement en lots de N, répartis entre les réplicas ;
+    le job est terminé (--checkpoint) une fois son dernier lot acquitté.
+    """
+    stop = threading.Event()
+    shared = create_queue("memory") if args.queue == "memory" else None
+    if shared:
+        # File locale : ce processus est son propre producteur
+        for job in jobs:
+            shared.put(job_task(job))
+    idle_timeout = args.idle_exit or (5 if shared else 0)
+    checkpoint = get_checkpoint()
+
+    def worker():
+        queue = shared or create_queue(args.queue)
+
+        def handle_job(task):
+            job = Job(**task.payload)
+            scraper = load_scraper(job.scraper)
+            if not (args.fanout and hasattr(scraper, "list_places")):
+                handle(job)
+                return
+            with current_job(job.key):
+                bbox = job.bbox if args.tiles and scraper_info(job.scraper)["tile_url_template"] else None
+                restaurants = scraper.list_places(job.url, job.city, **accepted_kwargs(scraper.list_places, bbox=bbox))
+            batches = -(-len(restaurants) // args.fanout)
+            if not batches and checkpoint:
+                checkpoint.record_done(job.key, 0)
+            for batch, i in enumerate(range(0, len(restaurants), args.fanout)):
+                queue.put(Task("enrich", dict(task.payload, restaurants=restaurants[i:i + args.fanout],
+                                              batch=batch, batches=batches)))
+            queue.flush()
+            logging.info(f"{job.scraper}/{job.city}: {len(restaurants)} restaurants publiés pour enrichissement")
+
+        def handle_enrich(task):
+            job = fanout_job(task.payload)
+            scraper = load_scraper(job.scraper)
+            with current_job(job.key):
+                # Rapport de livraison propre au lot : les lots d'un même job
+                # sont traités en parallèle par les workers
+                return enrich_and_process(scraper, scraper_info(job.scraper), task.payload["restaurants"],
+                                          job.city, args, f"{job.key}#{task.id}")
+
+        def on_acked(task, count):
+            if checkpoint and task.kind == "enrich":
+                checkpoint.record_batch_done(fanout_job(task.payload).key, task.payload["batch"],
+                                             task.payload["batches"], count or 0)
+
+        try:
+            return run_worker(queue, {"job": handle_job, "enrich": handle_enrich},
+                              idle_timeout=idle_timeout, stop=stop, on_acked=on_acked)
+        finally:
+            if not shared:
+                queue.close()
+
+    threads = [threading.Thread(target=worker, name=f"worker-{i}") for i in range(max(1, args.jobs))]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+
 def main():
     # Analyser les arguments de ligne de commande
     parser = argparse.ArgumentParser(description="Scraper de données pour restaurants")
     parser.add_argument("--parallel", action="store_true", help="Activer le traitement parallèle")
     parser.add_argument("--workers", type=int, default=5, help="Nombre de workers pour le traitement parallèle")
+    parser.add_argument("--async-pages", type=int, default=int(os.getenv("ASYNC_PAGES", "0")),
+                        help="Scrapers asynchrones : nombre de pages chargées simultanément dans un seul "
+                             "navigateur, sur une boucle asyncio (0 : scrapers synchrones)")
+    parser.add_argument("--jobs", type=int, default=1, help="Nombre de villes/sources scrapées simultanément")
+    parser.add_argument("--max-browsers", type=int, help="Nombre maximal de navigateurs ouverts, tous jobs confondus")
+    parser.add_argument("--domain-rate", action="append", default=[], metavar="DOMAINE=REQ/S",
+                        help="Limite de politesse par domaine, ex. www.google.com=2 (répétable)")
+    parser.add_argument("--id-mode", choices=["counter", "content"], default=os.getenv("ID_MODE", "counter"),
+                        help="Identifiants company_RC : compteur par blocs ou dérivés de la fiche Maps")
+    parser.add_argument("--incremental", action="store_true",
+                        help="N'enrichir et ne publier que les restaurants nouveaux ou modifiés")
+    parser.add_argument("--refresh-days", type=float, default=30,
+                        help="Âge maximal (jours) des données enrichies réutilisées en mode incrémental")
+    parser.add_argument("--tiles", action="store_true", default=os.getenv("TILES") == "1",
+                        help="Parcourir les villes ayant une bbox (villes_maroc.json) par tuiles de recherche "
+                             "en parallèle, redécoupées si trop denses, au lieu d'une seule recherche plafonnée")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Ne pas ignorer les lieux déjà renvoyés par une autre recherche de l'exécution")
+    parser.add_argument("--stream", action="store_true", help="Traitement en flux : envoi et écriture JSON Lines au fil de l'eau")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "0")),
+                        help="Port de l'endpoint Prometheus /metrics (0 : désactivé)")
+    parser.add_argument("--kafka-batch", action="store_true", help="Envoi Kafka pipeliné (attente des acquittements en fin de ville)")
+    parser.add_argument("--kafka-linger-ms", type=int, default=50, help="Délai de regroupement des messages Kafka en mode pipeliné")
+    parser.add_argument("--kafka-batch-size", type=int, default=64 * 1024, help="Taille des lots Kafka en octets en mode pipeliné")
+    parser.add_argument("--sink", choices=["kafka", "elasticsearch"], default=os.getenv("SINK", "kafka"),
+                        help="Destination des données : Kafka (pipeline Logstash/Vector) ou écriture directe Elasticsearch _bulk")
+    parser.add_argument("--es-url", default=os.getenv("ES_URL", "http://elasticsearch:9200"), help="URL Elasticsearch (--sink elasticsearch)")
+    parser.add_argument("--es-index", default=os.getenv("ES_INDEX", "business-%Y.%m.%d"),
+                        help="Index Elasticsearch, motif strftime accepté (--sink elasticsearch)")
+    parser.add_argument("--bulk-size", type=int, default=500, help="Documents par requête _bulk")
+    parser.add_argument("--bulk-concurrency", type=int, default=4, help="Requêtes _bulk simultanées")
+    parser.add_argument("--output-format", default=os.getenv("OUTPUT_FORMAT", "json"),
+                        help="Formats des fichiers output/, séparés par des virgules : json (par défaut), jsonl, jsonl.gz, "
+                             "jsonl.zst (zstandard), parquet (pyarrow)")
+    parser.add_argument("--no-postprocess", action="store_true",
+                        help="Envoyer les payloads bruts et laisser Logstash/Vector calculer les champs dérivés")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Journaliser la progression pour reprendre l'exécution après un redémarrage")
+    parser.add_argument("--run-id", default=os.getenv("RUN_ID") or date.today().strftime("%Y%m%d"),
+                        help="Identifiant de l'exécution reprise par --checkpoint (par défaut : date du jour)")
+    parser.add_argument("--role", choices=["standalone", "producer", "worker"], default=os.getenv("SCRAPER_ROLE", "standalone"),
+                        help="standalone : toutes les villes dans ce processus ; producer : publie les jobs dans la file "
+                             "de travail ; worker : traite les jobs de la file, partagée entre réplicas")
+    parser.add_argument("--queue", choices=["kafka", "memory"], default=os.getenv("WORK_QUEUE", "kafka"),
+                        help="File de travail des rôles producer/worker (memory : locale, pour les tests)")
+    parser.add_argument("--fanout", type=int, default=0,
+                        help="En mode worker, publier l'enrichissement en tâches de N restaurants (0 : désactivé)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Construire les jobs et résoudre les scrapers sans rien scraper, puis afficher le temps de démarrage")
+    parser.add_argument("--idle-exit", type=float, default=0,
+                        help="En mode worker, arrêt après N secondes sans tâche (0 : jamais avec Kafka)")
     args = parser.parse_args()
     
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+    configure_id_mode(args.id_mode)
+    configure_output(args.output_format)
+    if args.no_postprocess:
+        configure_postprocess(False)
+    if args.no_dedup:
+        configure_dedup(False)
+    if args.incremental:
+        configure_state_store(refresh_age=args.refresh_days * 86400)
+    if args.sink == "elasticsearch":
+        configure_sink(
+            "elasticsearch",
+            url=args.es_url,
+            index=args.es_index,
+            batch_size=args.bulk_size,
+            max_in_flight=args.bulk_concurrency,
+        )
+    else:
+        configure_sink(
+            "kafka",
+            pipelined=args.kafka_batch,
+            linger_ms=args.kafka_linger_ms,
+            batch_size=args.kafka_batch_size,
+        )
+    # Un navigateur gardé au chaud par worker d'enrichissement, plafonné globalement
+    max_browsers = args.max_browsers or (args.workers if args.parallel else 1)
+    configure_browser_pool(size=max_browsers)
+    if args.async_pages:
+        configure_async_browser(max_pages=args.async_pages)
     try:
         # Créer le dossier output s'il n'existe pas
         os.makedirs("output", exist_ok=True)
@@ -37,41 +260,70 @@ def main():
         with open("config/sources.json", encoding="utf-8") as f:
             sources = json.load(f)
         with open("config/villes_maroc.json", encoding="utf-8") as f:
-            villes = [v["city"] for v in json.load(f)]
-
-        for src in sources:
-            if "{param}" in src["url"]:
-                for ville in villes:
-                    url = src["url"].replace("{param}", ville)
-                    logging.info(f"Scraping pour la ville : {ville}")
-                    scraper = load_scraper(src["scraper"])
-                    
-                    # Utiliser les paramètres de parallélisme si disponibles dans le scraper
-                    if hasattr(scraper, "scrape") and "use_parallel" in scraper.scrape.__code__.co_varnames:
-                        items = run_scraper(scraper, url, use_parallel=args.parallel, max_workers=args.workers)
-                    else:
-                        items = run_scraper(scraper, url)
-                    
-                    # Traiter tous les résultats de cette ville en une seule fois
-                    process_city_results(items, ville)
-                    
-                    logging.info(f"Traitement terminé pour {ville}: {len(items)} éléments")
-            else:
-                scraper = load_scraper(src["scraper"])
-                
-                # Utiliser les paramètres de parallélisme si disponibles dans le scraper
-                if hasattr(scraper, "scrape") and "use_parallel" in scraper.scrape.__code__.co_varnames:
-                    items = run_scraper(scraper, src["url"], use_parallel=args.parallel, max_workers=args.workers)
-                else:
-                    items = run_scraper(scraper, src["url"])
-                
-                # Traiter tous les résultats en une seule fois
-                process_city_results(items, "unknown_city")
-                
-                logging.info(f"Traitement terminé: {len(items)} éléments")
+            villes = json.load(f)
+
+        jobs = build_jobs(sources, villes)
+        # Scrapers résolus une fois ; leurs débits par défaut cèdent à --domain-rate
+        scrapers = {name: scraper_info(name) for name in dict.fromkeys(job.scraper for job in jobs)}
+        rates = {}
+        for info in scrapers.values():
+            rates.update(info["rate_limits"])
+        rates.update(
+            (domain, float(rate))
+            for domain, rate in (entry.split("=", 1) for entry in args.domain_rate)
+        )
+        configure_domain_rates(rates)
+        checkpoint = configure_checkpoint(args.run_id) if args.checkpoint else None
+        if checkpoint:
+            # Reprise : les villes déjà terminées dans cette exécution sont ignorées
+            done = [job for job in jobs if checkpoint.is_done(job.key)]
+            if done:
+                logging.info(f"Reprise de l'exécution {args.run_id}: {len(done)} jobs déjà terminés ignorés")
+            jobs = [job for job in jobs if not checkpoint.is_done(job.key)]
+
+        if args.dry_run:
+            ready = time.perf_counter()
+            for name, info in scrapers.items():
+                capabilities = [key for key in ("supports_parallel", "async") if info[key]]
+                logging.info(f"Scraper {name}: {', '.join(capabilities) or 'synchrone'}, débits {info['rate_limits'] or 'non limités'}")
+            if args.tiles:
+                tiled = [job for job in jobs if job.bbox and scrapers[job.scraper]["tile_url_template"]]
+                logging.info(f"Mode par tuiles : {sum(len(grid(job.bbox)) for job in tiled)} tuiles initiales "
+                             f"pour {len(tiled)}/{len(jobs)} jobs")
+            logging.info(
+                f"Démarrage à blanc : {len(jobs)} jobs ; imports {(IMPORTED - STARTED) * 1000:.0f} ms, "
+                f"configuration et scrapers {(ready - IMPORTED) * 1000:.0f} ms, total {(ready - STARTED) * 1000:.0f} ms"
+            )
+            return
+
+        if args.role == "producer":
+            queue = create_queue(args.queue)
+            for job in jobs:
+                queue.put(job_task(job))
+            queue.close()
+            logging.info(f"{len(jobs)} jobs publiés dans la file de travail")
+            return
+
+        def handle(job):
+            logging.info(f"Scraping pour la ville : {job.city}")
+            scraper = load_scraper(job.scraper)
+            with current_job(job.key):
+                count = scrape_and_process(scraper, scraper_info(job.scraper), job.url, job.city, args,
+                                           job.bbox, job.key)
+            if checkpoint:
+                checkpoint.record_done(job.key, count)
+            return count
+        
+        if args.role == "worker":
+            run_queue_workers(args, jobs, handle)
+        else:
+            run_jobs(jobs, handle, max_concurrent=args.jobs)
     finally:
-        # Fermer proprement la connexion Kafka à la fin
-        close_kafka_sender()
+        # Fermer proprement la connexion Kafka, les navigateurs et le journal à la fin
+        close_sink()
+        close_event_loop()
+        close_browser_pool()
+        close_checkpoint()
 
 
 if __name__ == "__main__":
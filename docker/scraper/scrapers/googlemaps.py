@@ -1,33 +1,283 @@
+import asyncio
 import logging
+import os
 import re
-import requests
+import threading
+import time
 import concurrent.futures
-from scrapling.fetchers import StealthyFetcher
+from selectolax.lexbor import LexborHTMLParser
+from core.loader import scraper_info
+from utils.browser_pool import get_async_browser, get_browser_pool
+from utils.cache import SQLiteCache
+from utils.checkpoint import record_enriched, resume_current
+from utils.dedup import drop_duplicates
+from utils.enrichcache import cache_enrichment, enrichment_key, get_enrichment_cache, is_found
+from utils.http import get_http_session
+from utils.metrics import ENRICH_TIERS, register_cache, timed
+from utils.ratelimit import TokenBucket, get_domain_limiter
+from utils.places import coordinates_from_url, place_key
+from utils.state import get_state_store
+from utils.tiles import TILE_MAX_DEPTH, grid, is_dense
 
 logger = logging.getLogger(__name__)
-StealthyFetcher.auto_match = True  
+
+# Politesse par défaut envers Google (req/s, 0 : pas de limite), surchargée par --domain-rate
+GOOGLE_RATE = float(os.getenv("GOOGLE_RATE", "0"))
+
+# Capacités déclarées, lues par core.loader.scraper_info() sans lancer de navigateur
+SCRAPER_INFO = {
+    "supports_parallel": True,
+    "async": True,
+    "rate_limits": {"www.google.com": GOOGLE_RATE} if GOOGLE_RATE else {},
+    "url_template": "https://www.google.com/maps/search/restaurant+{param}/",
+    # Recherche centrée sur une tuile de la ville (mode --tiles)
+    "tile_url_template": "https://www.google.com/maps/search/restaurant/@{lat},{lon},{zoom}z",
+}
+
+# Cache persistant du géocodage inverse (coordonnées arrondies -> adresse)
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "output/geocode_cache.sqlite")
+GEOCODE_PRECISION = int(os.getenv("GEOCODE_PRECISION", "5"))
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90")) * 86400
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "200000"))
+
+# Service Nominatim : 1 req/s sur l'instance publique, plus si auto-hébergé
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
+NOMINATIM_RATE = float(os.getenv("NOMINATIM_RATE", "1"))
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "4"))
+NOMINATIM_HEADERS = {
+    "User-Agent": "YourApp/1.0 (your_email@example.com)"
+}
+
+geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+nominatim_limiter = TokenBucket(NOMINATIM_RATE, capacity=1)
+
+def get_geocode_cache() -> SQLiteCache:
+    """Retourne le cache de géocodage, en le créant si nécessaire"""
+    global geocode_cache
+    with _geocode_cache_lock:
+        if geocode_cache is None:
+            geocode_cache = SQLiteCache(
+                GEOCODE_CACHE_PATH,
+                table="reverse_geocode",
+                ttl=GEOCODE_CACHE_TTL,
+                max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+            )
+            register_cache("geocode", geocode_cache)
+        return geocode_cache
+
+def geocode_key(lat: str, lon: str, precision: int = GEOCODE_PRECISION) -> str:
+    """Clé de cache : coordonnées arrondies à `precision` décimales"""
+    return f"{float(lat):.{precision}f},{float(lon):.{precision}f}"
 
 def reverse_geocode(lat: str, lon: str) -> str | None:
+    """
+    Retourne l'adresse complète (display_name) à partir des coordonnées,
+    depuis le cache disque si possible, sinon via Nominatim.
+    """
+    address = get_geocode_cache().get(geocode_key(lat, lon))
+    if address is not None:
+        return address
+    return fetch_and_cache_geocode(lat, lon)
+
+def fetch_and_cache_geocode(lat: str, lon: str) -> str | None:
+    """Interroge Nominatim et mémorise l'adresse obtenue dans le cache"""
+    address = fetch_reverse_geocode(lat, lon)
+    if address is not None:
+        get_geocode_cache().set(geocode_key(lat, lon), address)
+    return address
+
+def fetch_reverse_geocode(lat: str, lon: str) -> str | None:
     """
     Appelle Nominatim pour obtenir l'adresse complète (display_name)
     à partir des coordonnées.
     """
-    url = (
-        "https://nominatim.openstreetmap.org/reverse"
-        f"?format=json&lat={lat}&lon={lon}&zoom=16&addressdetails=1"
-    )
-    headers = {
-        "User-Agent": "YourApp/1.0 (your_email@example.com)"
-    }
+    params = {"format": "json", "lat": lat, "lon": lon, "zoom": 16, "addressdetails": 1}
+    session = get_http_session("nominatim", pool_size=GEOCODE_WORKERS, headers=NOMINATIM_HEADERS)
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        nominatim_limiter.acquire()
+        with timed("geocode"):
+            resp = session.get(NOMINATIM_URL, params=params, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
         return data.get('display_name')
     except Exception as e:
         logger.warning(f"Reverse geocoding failed for {lat},{lon}: {e}")
         return None
 
+def _geocode_uncached(restaurant):
+    restaurant['address'] = fetch_and_cache_geocode(restaurant['latitude'], restaurant['longitude'])
+    return restaurant
+
+def geocode_restaurants(restaurants, max_workers=GEOCODE_WORKERS):
+    """
+    Étape de géocodage concurrente : géocode les restaurants dans un pool de
+    threads (débit limité par `nominatim_limiter`) et les renvoie au fur et à
+    mesure, pour que l'enrichissement démarre sans attendre la fin du géocodage.
+    Les adresses déjà en cache sont renvoyées immédiatement.
+    """
+    cache = get_geocode_cache()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for restaurant in restaurants:
+            lat, lng = restaurant.get('latitude'), restaurant.get('longitude')
+            if lat and lng and not restaurant.get('address'):
+                cached = cache.get(geocode_key(lat, lng))
+                if cached is None:
+                    pending.add(executor.submit(_geocode_uncached, restaurant))
+                    continue
+                restaurant['address'] = cached
+            yield restaurant
+
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+    logger.info(f"Cache de géocodage : {cache.stats()}")
+
+# Règles d'extraction de la page de recherche Google, communes aux deux niveaux
+PHONE_PATTERN = r'(0[567](?:[\s.-]?\d{2}){4})'
+SITE_SELECTOR = 'div.yuRUbf a:not([href*="instagram.com"]):not([href*="facebook.com"]):not([href*="tripadvisor.com"]):not([href*="google.com"])'
+SOCIAL_DOMAINS = ("facebook.com", "instagram.com", "twitter.com", "linkedin.com", "youtube.com")
+
+# Niveau HTTP simple, tenté avant le navigateur (ENRICH_HTTP_TIER=0 pour le désactiver)
+ENRICH_HTTP_TIER = os.getenv("ENRICH_HTTP_TIER", "1") == "1"
+SEARCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "fr-FR,fr;q=0.9",
+}
+# Pages renvoyées par Google à un client suspect (captcha, consentement)
+BLOCKED_MARKERS = ("/sorry/", "consent.google.")
+
+def parse_search_page(page) -> dict:
+    """
+    Extrait d'une page de résultats Google (rendue par le navigateur) le
+    numéro de téléphone, le site officiel et les liens vers les réseaux
+    sociaux. Même analyse que pour le niveau HTTP : parse_search_html.
+    """
+    return parse_search_html(str(page.html_content))
+
+
+def parse_search_html(html: str) -> dict:
+    """Équivalent de parse_search_page() sur du HTML brut (selectolax/lexbor)"""
+    tree = LexborHTMLParser(html)
+    
+    # Numéro de téléphone : premier nœud texte qui correspond
+    phone = None
+    root = tree.body or tree.root
+    if root is not None:
+        for node in root.traverse(include_text=True):
+            if node.tag == '-text':
+                match = re.search(PHONE_PATTERN, node.text_content)
+                if match:
+                    phone = match.group(1)
+                    break
+    
+    site_element = tree.css_first(SITE_SELECTOR)
+    site = site_element.attributes.get("href") if site_element else None
+    
+    socials = []
+    for a in tree.css("a[href]"):
+        href = a.attributes.get("href")
+        if href and any(domain in href for domain in SOCIAL_DOMAINS):
+            socials.append(href)
+    socials = list(dict.fromkeys(socials))
+    
+    return {
+        'telephone': phone,
+        'site_web': site,
+        'reseaux_sociaux': socials,
+    }
+
+def fetch_search_http(url: str) -> dict | None:
+    """
+    Niveau 1 : recherche par simple requête HTTP (session partagée).
+    Retourne None si Google bloque la requête (captcha, consentement).
+    """
+    limiter = get_domain_limiter(url)
+    if limiter:
+        limiter.acquire()
+    session = get_http_session("google", headers=SEARCH_HEADERS)
+    resp = session.get(url, timeout=10)
+    if resp.status_code in (403, 429) or any(marker in resp.url for marker in BLOCKED_MARKERS):
+        ENRICH_TIERS.inc(tier="http", outcome="blocked")
+        return None
+    resp.raise_for_status()
+    return parse_search_html(resp.text)
+
+def _enrich_http(url, restaurant_name):
+    """Niveau HTTP : données trouvées, ou None pour passer au navigateur"""
+    try:
+        with timed("enrich_http"):
+            data = fetch_search_http(url)
+    except Exception as e:
+        logger.debug(f"Recherche HTTP échouée pour {restaurant_name}: {e}")
+        ENRICH_TIERS.inc(tier="http", outcome="error")
+        return None
+    if data is None:
+        return None
+    if not is_found(data):
+        ENRICH_TIERS.inc(tier="http", outcome="miss")
+        return None
+    ENRICH_TIERS.inc(tier="http", outcome="hit")
+    return data
+
+def _browser_failed(restaurant_name, error):
+    logger.warning(f"Enrichissement échoué pour {restaurant_name}: {error}")
+    ENRICH_TIERS.inc(tier="browser", outcome="error")
+    return {
+        'telephone': None,
+        'site_web': None,
+        'reseaux_sociaux': [],
+    }
+
+def _enrich_browser(url, restaurant_name):
+    """Niveau navigateur furtif, plus coûteux : toujours un résultat (vide en cas d'échec)"""
+    try:
+        with timed("enrich"):
+            # Lancer la requête dans un navigateur du pool (déjà démarré)
+            page = get_browser_pool().fetch(
+                url,
+                network_idle=True,
+            )
+            data = parse_search_page(page)
+    except Exception as e:
+        return _browser_failed(restaurant_name, e)
+    ENRICH_TIERS.inc(tier="browser", outcome="hit" if is_found(data) else "miss")
+    return data
+
+async def _enrich_browser_async(url, restaurant_name):
+    """Variante de _enrich_browser() dans un onglet du navigateur asynchrone partagé"""
+    try:
+        with timed("enrich"):
+            page = await get_async_browser().fetch(url, network_idle=True)
+            data = parse_search_page(page)
+    except Exception as e:
+        return _browser_failed(restaurant_name, e)
+    ENRICH_TIERS.inc(tier="browser", outcome="hit" if is_found(data) else "miss")
+    return data
+
+def _search_request(restaurant):
+    """
+    Clé de cache et URL de recherche Google du restaurant, ou None s'il n'y a
+    rien à chercher (résultat en cache alors appliqué au restaurant).
+    """
+    # Pas de nom, ou données enrichies récentes reprises de l'état local
+    if not restaurant.get('name') or restaurant.get('_enriched_at'):
+        return None
+        
+    restaurant_name = restaurant['name']
+    
+    # Chaînes et restaurants présents dans plusieurs recherches : résultat en cache
+    key = enrichment_key(restaurant_name, restaurant.get('city'))
+    cached = get_enrichment_cache().get(key)
+    if cached is not None:
+        restaurant.update(cached["data"])
+        return None
+    
+    logger.info(f"Enrichissement des données pour: {restaurant_name}")
+    query = restaurant_name.replace(" ", "+")
+    return key, f"https://www.google.com/search?q={query}"
+
 def enrich_restaurant_info(restaurant):
     """
     Récupère des informations complémentaires pour un restaurant:
@@ -35,186 +285,401 @@ def enrich_restaurant_info(restaurant):
     - site web
     - réseaux sociaux
     
+    Tente d'abord une simple requête HTTP, puis le navigateur si elle est
+    bloquée ou ne trouve rien.
+    
     Prend un dictionnaire restaurant et retourne le même dictionnaire enrichi
     """
-    if not restaurant.get('name'):
+    search = _search_request(restaurant)
+    if search is None:
         return restaurant
-        
-    restaurant_name = restaurant['name']
-    logger.info(f"Enrichissement des données pour: {restaurant_name}")
-    query = restaurant_name.replace(" ", "+")
-    url = f"https://www.google.com/search?q={query}"
+    key, url = search
     
-    try:
-        # Lancer la requête via StealthyFetcher
-        page = StealthyFetcher.fetch(
-            url,
-            headless=True,
-            network_idle=True,
-        )
-        
-        # Numéro de téléphone
-        phone_pattern = r'(0[567](?:[\s.-]?\d{2}){4})'
-        phone_element = page.find_by_regex(phone_pattern, first_match=True)
-        phone = phone_element.re_first(phone_pattern) if phone_element else None
-        
-        # Site officiel
-        site_element = page.css_first('div.yuRUbf a:not([href*="instagram.com"]):not([href*="facebook.com"]):not([href*="tripadvisor.com"]):not([href*="google.com"])')
-        site = site_element.attrib.get("href") if site_element else None
-        
-        # Réseaux sociaux
-        social_domains = ("facebook.com", "instagram.com", "twitter.com", "linkedin.com", "youtube.com")
-        socials = []
-        for a in page.css("a[href]"):
-            href = a.attrib.get("href")
-            if href and any(domain in href for domain in social_domains):
-                socials.append(href)
-        socials = list(dict.fromkeys(socials))  # Supprimer les doublons
+    data = _enrich_http(url, restaurant['name']) if ENRICH_HTTP_TIER else None
+    if data is None:
+        data = _enrich_browser(url, restaurant['name'])
+    
+    # Résultat vide ou échec : mis en cache avec un TTL plus court
+    cache_enrichment(key, data)
+    # Ajouter les nouvelles informations au dictionnaire restaurant
+    restaurant.update(data)
+    return restaurant
+
+async def enrich_restaurant_info_async(restaurant):
+    """
+    Variante asynchrone de enrich_restaurant_info() : le niveau HTTP passe
+    par un thread, le navigateur par un onglet du navigateur asynchrone.
+    """
+    search = _search_request(restaurant)
+    if search is None:
+        return restaurant
+    key, url = search
+    
+    data = await asyncio.to_thread(_enrich_http, url, restaurant['name']) if ENRICH_HTTP_TIER else None
+    if data is None:
+        data = await _enrich_browser_async(url, restaurant['name'])
+    
+    cache_enrichment(key, data)
+    restaurant.update(data)
+    return restaurant
+
+# Sélecteurs des cartes de résultats Google Maps
+CARD_SELECTOR = 'div.Nv2PK.THOPZb.CpccDe'
+NAME_SELECTOR = 'div.qBF1Pd'
+LINK_SELECTOR = 'a.hfpxzc'
+RATING_SELECTOR = 'span.MW4etd'
+REVIEWS_SELECTOR = 'span.UY7F9'
+CUISINE_SELECTOR = 'div.W4Efsd > div.W4Efsd span span'
+
+def _node_text(node, deep=False):
+    if node is None:
+        return None
+    text = node.text(deep=deep).strip()
+    return text or None
+
+def _price_range(card):
+    """Première fourchette de prix (« MAD ... ») de la carte, en un seul parcours de ses nœuds texte"""
+    for node in card.traverse(include_text=True):
+        if node.tag == '-text' and node.text_content.lstrip().startswith('MAD'):
+            return node.parent.text(deep=True).strip()
+    return None
+
+def extract_cards(html: str) -> list[dict]:
+    """
+    Extrait les informations de base de toutes les cartes de résultats à
+    partir du HTML de la page, en une seule analyse (selectolax/lexbor).
+    """
+    tree = LexborHTMLParser(html)
+    restaurants = []
+    for card in tree.css(CARD_SELECTOR):
+        link = card.css_first(LINK_SELECTOR)
+        href = link.attributes.get('href') if link else None
+        if href:
+            full_url = href if href.startswith('http') else f"https://www.google.com{href}"
+        else:
+            full_url = None
         
-        # Ajouter les nouvelles informations au dictionnaire restaurant
-        restaurant['telephone'] = phone
-        restaurant['site_web'] = site
-        restaurant['reseaux_sociaux'] = socials
+        review_count = _node_text(card.css_first(REVIEWS_SELECTOR))
+        lat, lng = coordinates_from_url(full_url)
         
-        return restaurant
-    except Exception as e:
-        logger.warning(f"Enrichissement échoué pour {restaurant_name}: {e}")
-        restaurant['telephone'] = None
-        restaurant['site_web'] = None
-        restaurant['reseaux_sociaux'] = []
-        return restaurant
+        # Créer l'objet restaurant de base (l'adresse est complétée par geocode_restaurants)
+        restaurants.append({
+            'name': _node_text(card.css_first(NAME_SELECTOR)),
+            'url': full_url,
+            'rating': _node_text(card.css_first(RATING_SELECTOR)),
+            'review_count': review_count.strip('()') if review_count else None,
+            'cuisine': _node_text(card.css_first(CUISINE_SELECTOR)),
+            'price_range': _price_range(card),
+            'address': None,
+            'latitude': lat,
+            'longitude': lng,
+            'source': 'googlemaps'
+        })
+    return restaurants
+
+# Chargement adaptatif de la liste de résultats
+SCROLL_TARGET_RESULTS = int(os.getenv("SCROLL_TARGET_RESULTS", "0")) or None
+SCROLL_TIME_BUDGET = float(os.getenv("SCROLL_TIME_BUDGET", "60"))
+SCROLL_IDLE_TIMEOUT = float(os.getenv("SCROLL_IDLE_TIMEOUT", "3"))
+RESULT_SELECTOR = 'div[role="article"]'
+FEED_SELECTOR = 'div[role="feed"]'
+# Marqueur « Vous êtes arrivé à la fin de la liste » du flux Maps
+END_OF_LIST_SELECTOR = 'span.HlvSq'
+
+class ScrollMetrics:
+    """Mesures du chargement de la liste de résultats"""
+
+    def __init__(self):
+        self.scrolls = 0
+        self.results = 0
+        self.waits = []
+        self.duration = 0.0
+        self.stop_reason = None
+
+    def __repr__(self):
+        mean_wait = sum(self.waits) / len(self.waits) if self.waits else 0.0
+        return (
+            f"ScrollMetrics(scrolls={self.scrolls}, results={self.results}, "
+            f"duration={self.duration:.1f}s, mean_wait={mean_wait * 1000:.0f}ms, "
+            f"stop_reason={self.stop_reason!r})"
+        )
 
-def scrape_google_maps(url: str) -> list[dict]:
+def load_all_results(page, metrics, target_results=None, time_budget=SCROLL_TIME_BUDGET,
+                     idle_timeout=SCROLL_IDLE_TIMEOUT):
+    """
+    Fait défiler le flux de résultats jusqu'au marqueur de fin de liste, au
+    nombre de résultats visé ou à l'épuisement du budget de temps. Après chaque
+    défilement, attend l'apparition de nouvelles cartes (ou du marqueur de fin)
+    plutôt qu'un délai fixe ; s'arrête si rien n'arrive en `idle_timeout` secondes.
+    """
+    start = time.monotonic()
+    count = len(page.query_selector_all(RESULT_SELECTOR))
+    while True:
+        metrics.results = count
+        if page.query_selector(END_OF_LIST_SELECTOR):
+            metrics.stop_reason = "fin de liste"
+            break
+        if target_results and count >= target_results:
+            metrics.stop_reason = "objectif atteint"
+            break
+        remaining = time_budget - (time.monotonic() - start)
+        if remaining <= 0:
+            metrics.stop_reason = "budget de temps épuisé"
+            break
+
+        feed = page.query_selector(FEED_SELECTOR)
+        if feed:
+            feed.evaluate("el => el.scrollTo(0, el.scrollHeight)")
+        else:
+            page.mouse.wheel(0, 1000)
+        metrics.scrolls += 1
+
+        wait_start = time.monotonic()
+        try:
+            page.wait_for_function(
+                """([selector, endSelector, previous]) =>
+                    document.querySelectorAll(selector).length > previous
+                    || document.querySelector(endSelector) !== null""",
+                arg=[RESULT_SELECTOR, END_OF_LIST_SELECTOR, count],
+                timeout=min(idle_timeout, remaining) * 1000,
+            )
+        except Exception:
+            metrics.waits.append(time.monotonic() - wait_start)
+            metrics.stop_reason = "plus de nouveaux résultats"
+            break
+        metrics.waits.append(time.monotonic() - wait_start)
+        count = len(page.query_selector_all(RESULT_SELECTOR))
+
+    metrics.results = len(page.query_selector_all(RESULT_SELECTOR))
+    metrics.duration = time.monotonic() - start
+    return page
+
+def scrape_google_maps(url: str, target_results=SCROLL_TARGET_RESULTS,
+                       time_budget=SCROLL_TIME_BUDGET, metrics=None) -> list[dict]:
     """  
     Scraper pour Google Maps (recherche restaurants) qui extrait 
     les informations de base des restaurants.
+    `metrics` (ScrollMetrics) reçoit les mesures du défilement si fourni.
     """  
+    metrics = metrics or ScrollMetrics()
+    
+    def scroll_until_complete(page):
+        with timed("scroll"):
+            return load_all_results(page, metrics, target_results=target_results, time_budget=time_budget)
   
-    def scroll_until_no_new_results(page, max_scrolls=20):    
-        previous_count = 0    
-        for _ in range(max_scrolls):    
-            # Use Playwright's query_selector_all instead of css()  
-            cards = page.query_selector_all('div[role="article"]')    
-            if len(cards) <= previous_count:    
-                break    
-            previous_count = len(cards)    
-            page.mouse.wheel(0, 1000)    
-            page.wait_for_timeout(800)    
-        return page   
-  
-    # 1) Chargement de la page avec scroll  
-    page = StealthyFetcher.fetch(  
+    # 1) Chargement de la page avec défilement adaptatif
+    page = get_browser_pool().fetch(  
         url,  
-        headless=True,  
         disable_resources=True,  
         network_idle=True,  
-        page_action=scroll_until_no_new_results,  
+        page_action=scroll_until_complete,  
         timeout=90000  
     )  
     logger.info(f"Lancement du scraping : {url}")  
+    logger.info(f"Chargement des résultats : {metrics}")
   
-    # 2) Sélection des cartes de restaurants  
-    cards = page.css('div.Nv2PK.THOPZb.CpccDe')  
-    if len(cards) < 5:  
-        logger.warning(f"⚠️ Seulement {len(cards)} cartes trouvées.")  
-    logger.info(f"Nombre total de cartes après scroll : {len(cards)}")  
-  
-    restaurants = []  
-    for card in cards:  
-        # Nom - Fixed: TextHandler doesn't need .strip()  
-        name_el = card.css_first('div.qBF1Pd::text')  
-        name = str(name_el).strip() if name_el else None  
-  
-        # URL de la fiche - Fixed: This returns string directly  
-        href = card.css_first('a.hfpxzc::attr(href)')  
-        full_url = f"https://www.google.com{href}" if href else None  
-  
-        # Note et avis - Fixed: TextHandler handling  
-        rating_el = card.css_first('span.MW4etd::text')  
-        rating = str(rating_el).strip() if rating_el else None  
-        review_el = card.css_first('span.UY7F9::text')  
-        review_count = str(review_el).strip().strip('()') if review_el else None  
-  
-        # Fourchette de prix - This part is correct  
-        price_range = None  
-        for span in card.css('span'):  
-            txt = span.text.strip()  
-            if txt.startswith('MAD'):  
-                price_range = txt  
-                break  
-  
-        # Type de cuisine - Fixed: TextHandler handling  
-        cuisine_el = card.css_first('div.W4Efsd > div.W4Efsd span span::text')  
-        cuisine = str(cuisine_el).strip() if cuisine_el else None  
-  
-        # Rest of the code remains the same...  
-        lat, lng = None, None  
-        if full_url:  
-            m = re.search(r'!3d([-\d\.]+)!4d([-\d\.]+)', full_url)  
-            if m:  
-                lat, lng = m.group(1), m.group(2)  
-  
-        address = None  
-        if lat and lng:  
-            address = reverse_geocode(lat, lng)  
-        
-        # Créer l'objet restaurant de base
-        restaurant = {  
-            'name': name,  
-            'url': full_url,  
-            'rating': rating,  
-            'review_count': review_count,  
-            'cuisine': cuisine,  
-            'price_range': price_range,  
-            'address': address,  
-            'latitude': lat,  
-            'longitude': lng,  
-            'source': 'googlemaps'  
-        }
-        
-        restaurants.append(restaurant)  
+    # 2) Extraction de toutes les cartes en une seule passe sur le HTML
+    with timed("extract"):
+        restaurants = extract_cards(page.html_content)
+    if len(restaurants) < 5:  
+        logger.warning(f"⚠️ Seulement {len(restaurants)} cartes trouvées.")  
+    logger.info(f"Nombre total de cartes après scroll : {len(restaurants)}")  
   
     logger.info(f"Total de restaurants extraits : {len(restaurants)}")  
     return restaurants
 
-def enrich_restaurants_parallel(restaurants, max_workers=5):
+def enrich_restaurants_stream(restaurants, max_workers=5):
     """
-    Enrichit une liste de restaurants en parallèle en utilisant des threads
+    Enrichit les restaurants en parallèle (threads) et les renvoie dès que
+    chacun est prêt. `restaurants` peut être un générateur : les restaurants
+    sont soumis au fil de l'eau, sans attendre la fin de l'étape précédente.
     """
-    enriched_restaurants = []
+    def collect(future):
+        restaurant = future_to_restaurant.pop(future)
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enrichissement pour {restaurant.get('name', 'inconnu')}: {e}")
+            # Renvoyer quand même le restaurant non enrichi
+            return restaurant
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Soumettre tous les restaurants pour enrichissement
-        future_to_restaurant = {executor.submit(enrich_restaurant_info, restaurant): restaurant for restaurant in restaurants}
+        future_to_restaurant = {}
+        for restaurant in restaurants:
+            future_to_restaurant[executor.submit(enrich_restaurant_info, restaurant)] = restaurant
+            # Renvoyer les enrichissements déjà terminés pendant la soumission
+            for future in [f for f in future_to_restaurant if f.done()]:
+                yield collect(future)
         
-        # Collecter les résultats au fur et à mesure qu'ils sont terminés
-        for future in concurrent.futures.as_completed(future_to_restaurant):
-            restaurant = future_to_restaurant[future]
-            try:
-                enriched_restaurant = future.result()
-                enriched_restaurants.append(enriched_restaurant)
-            except Exception as e:
-                logger.error(f"Erreur lors de l'enrichissement pour {restaurant.get('name', 'inconnu')}: {e}")
-                # Ajouter quand même le restaurant non enrichi
-                enriched_restaurants.append(restaurant)
+        # Collecter les résultats restants au fur et à mesure qu'ils sont terminés
+        for future in concurrent.futures.as_completed(list(future_to_restaurant)):
+            yield collect(future)
+
+def enrich_restaurants_parallel(restaurants, max_workers=5):
+    """
+    Enrichit une liste de restaurants en parallèle en utilisant des threads
+    """
+    return list(enrich_restaurants_stream(restaurants, max_workers))
+
+def _scrape_tile(tile, url_template):
+    """Cartes d'une tuile, et vrai si sa liste semble tronquée"""
+    metrics = ScrollMetrics()
+    restaurants = scrape_google_maps(tile.url(url_template), metrics=metrics)
+    return restaurants, is_dense(len(restaurants), metrics.stop_reason)
+
+def scrape_tiles(bbox, city=None, url_template=None):
+    """
+    Cartes Google Maps de toutes les tuiles de `bbox`, chargées en parallèle
+    (autant de tuiles simultanées que de navigateurs du pool). Une tuile dont
+    la liste est plafonnée est redécoupée en quatre, jusqu'à TILE_MAX_DEPTH.
+    Les résultats sont fusionnés par lieu. `url_template` : par défaut le
+    tile_url_template déclaré (scraper_info).
+    """
+    url_template = url_template or scraper_info("googlemaps")["tile_url_template"]
+    merged = {}
+    tiles = dense = cards = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=get_browser_pool().size) as executor:
+        pending = {executor.submit(_scrape_tile, tile, url_template): tile for tile in grid(bbox)}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                tile = pending.pop(future)
+                tiles += 1
+                try:
+                    restaurants, truncated = future.result()
+                except Exception as e:
+                    logger.error(f"Échec de la tuile {tile} ({city}): {e}")
+                    continue
+                cards += len(restaurants)
+                for restaurant in restaurants:
+                    merged.setdefault(place_key(restaurant) or id(restaurant), restaurant)
+                if truncated and tile.depth < TILE_MAX_DEPTH:
+                    dense += 1
+                    for child in tile.split():
+                        pending[executor.submit(_scrape_tile, child, url_template)] = child
+    logger.info(f"{city}: {tiles} tuiles ({dense} redécoupées), {cards} cartes, {len(merged)} lieux distincts")
+    return list(merged.values())
+
+def list_places(url: str, city=None, bbox=None) -> list[dict]:
+    """
+    Première moitié du pipeline : cartes Google Maps de la page (ou des
+    tuiles de `bbox`, voir scrape_tiles), filtrées par le dédoublonnage de
+    l'exécution, le mode incrémental et la reprise. Les restaurants renvoyés
+    peuvent être enrichis ailleurs (tâches d'enrichissement distribuées).
+    """
+    restaurants = scrape_tiles(bbox, city) if bbox else scrape_google_maps(url)
+    if city:
+        # La ville fait partie de la clé du cache d'enrichissement
+        for restaurant in restaurants:
+            restaurant.setdefault('city', city)
     
-    return enriched_restaurants
+    # Lieux déjà renvoyés par une autre recherche de l'exécution : ni géocodés, ni enrichis, ni republiés
+    restaurants = drop_duplicates(restaurants, url, city)
+    
+    # Mode incrémental : ignorer les lieux inchangés depuis la dernière publication
+    state = get_state_store()
+    if state:
+        restaurants = list(state.filter_changes(restaurants))
+    
+    # Reprise après redémarrage : ignorer les lieux déjà livrés, reprendre les enrichis
+    return list(resume_current(restaurants))
 
-def scrape(url: str, use_parallel=True, max_workers=5) -> list[dict]:
+def enrich_places(restaurants: list[dict], use_parallel=True, max_workers=5):
     """
-    Fonction principale qui combine le scraping de Google Maps et l'enrichissement des données
+    Seconde moitié du pipeline : géocode et enrichit les restaurants donnés,
+    renvoyés au fur et à mesure.
     """
-    # Première étape : récupérer les informations de base des restaurants
-    restaurants = scrape_google_maps(url)
+    # Géocodage concurrent, dont les résultats alimentent l'enrichissement
+    geocoded = geocode_restaurants(restaurants)
     
-    # Deuxième étape : enrichir les données des restaurants
     if use_parallel:
         logger.info(f"Enrichissement des données en parallèle pour {len(restaurants)} restaurants...")
-        return enrich_restaurants_parallel(restaurants, max_workers)
+        enriched = enrich_restaurants_stream(geocoded, max_workers)
     else:
         logger.info(f"Enrichissement des données séquentiel pour {len(restaurants)} restaurants...")
-        enriched_restaurants = []
-        for restaurant in restaurants:
-            enriched_restaurant = enrich_restaurant_info(restaurant)
-            enriched_restaurants.append(enriched_restaurant)
-        return enriched_restaurants
\ No newline at end of file
+        enriched = (enrich_restaurant_info(restaurant) for restaurant in geocoded)
+    
+    for restaurant in enriched:
+        # Journalisé avant l'envoi pour ne pas refaire l'enrichissement en cas de reprise
+        record_enriched(restaurant)
+        yield restaurant
+    
+    logger.info(f"Pool de navigateurs : {get_browser_pool().stats()}")
+
+def scrape_stream(url: str, use_parallel=True, max_workers=5, city=None, bbox=None):
+    """
+    Variante en flux de scrape() : renvoie chaque restaurant dès qu'il est
+    géocodé et enrichi, au lieu d'une liste complète en fin de ville.
+    """
+    yield from enrich_places(list_places(url, city, bbox), use_parallel=use_parallel, max_workers=max_workers)
+
+def scrape(url: str, use_parallel=True, max_workers=5, city=None, bbox=None) -> list[dict]:
+    """
+    Fonction principale qui combine le scraping de Google Maps et l'enrichissement des données.
+    Avec `bbox`, la ville est parcourue par tuiles (scrape_tiles) au lieu d'une seule recherche.
+    """
+    return list(scrape_stream(url, use_parallel=use_parallel, max_workers=max_workers, city=city, bbox=bbox))
+
+async def enrich_places_async(restaurants: list[dict]):
+    """
+    Variante asynchrone de enrich_places() : le géocodage tourne dans un
+    thread et chaque restaurant géocodé est aussitôt enrichi dans la boucle
+    partagée, le navigateur asynchrone limitant le nombre de pages chargées
+    simultanément.
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+    geocoded = asyncio.Queue()
+    enriched = asyncio.Queue()
+    tasks = set()
+    
+    def geocode():
+        try:
+            for restaurant in geocode_restaurants(restaurants):
+                loop.call_soon_threadsafe(geocoded.put_nowait, restaurant)
+        finally:
+            loop.call_soon_threadsafe(geocoded.put_nowait, done)
+    
+    async def enrich(restaurant):
+        try:
+            restaurant = await enrich_restaurant_info_async(restaurant)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enrichissement pour {restaurant.get('name', 'inconnu')}: {e}")
+        enriched.put_nowait(restaurant)
+    
+    async def dispatch():
+        # Un enrichissement par restaurant, lancé dès la sortie du géocodage
+        while (restaurant := await geocoded.get()) is not done:
+            task = asyncio.create_task(enrich(restaurant))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(set(tasks))
+        enriched.put_nowait(done)
+    
+    logger.info(f"Enrichissement asynchrone des données pour {len(restaurants)} restaurants...")
+    geocoder = asyncio.ensure_future(asyncio.to_thread(geocode))
+    dispatcher = asyncio.ensure_future(dispatch())
+    try:
+        while (restaurant := await enriched.get()) is not done:
+            record_enriched(restaurant)
+            yield restaurant
+        # Remonte une erreur du géocodage
+        await geocoder
+    finally:
+        dispatcher.cancel()
+        for task in tasks:
+            task.cancel()
+    
+    logger.info(f"Navigateur asynchrone : {get_async_browser().stats()}")
+
+async def scrape_stream_async(url: str, city=None, bbox=None):
+    """Variante asynchrone de scrape_stream() (utilisée avec --async-pages)"""
+    # Le chargement de la page Maps (défilement) reste dans le pool synchrone
+    restaurants = await asyncio.to_thread(list_places, url, city, bbox)
+    async for restaurant in enrich_places_async(restaurants):
+        yield restaurant
+
+async def scrape_async(url: str, city=None, bbox=None) -> list[dict]:
+    """Variante asynchrone de scrape()"""
+    return [restaurant async for restaurant in scrape_stream_async(url, city, bbox)]
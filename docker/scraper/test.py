@@ -4,6 +4,7 @@ import logging
 import argparse
 from core.loader import load_scraper
 from core.runner import run_scraper
+from utils.browser_pool import close_browser_pool, configure_browser_pool
 import signal
 import sys
 from datetime import datetime
@@ -22,6 +23,7 @@ logger = logging.getLogger(__name__)
 # Gestion propre de l'arrêt du programme
 def signal_handler(sig, frame):
     logging.info("Arrêt du scraper...")
+    close_browser_pool()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -56,6 +58,9 @@ def main():
     parser.add_argument("--scraper", type=str, default="googlemaps", help="Scraper à utiliser (par défaut: googlemaps)")
     args = parser.parse_args()
     
+    # Un navigateur gardé au chaud par worker d'enrichissement
+    configure_browser_pool(size=args.workers if args.parallel else 1)
+    
     try:
         # Créer le dossier output s'il n'existe pas
         os.makedirs("output", exist_ok=True)
@@ -93,12 +98,9 @@ def main():
                 # Charger le scraper
                 scraper = load_scraper(args.scraper)
                 
-                # Utiliser les paramètres de parallélisme si disponibles
-                if hasattr(scraper, "scrape") and "use_parallel" in scraper.scrape.__code__.co_varnames:
-                    logger.info(f"Mode parallèle: {'activé' if args.parallel else 'désactivé'} avec {args.workers} workers")
-                    items = run_scraper(scraper, url, use_parallel=args.parallel, max_workers=args.workers)
-                else:
-                    items = run_scraper(scraper, url)
+                # Paramètres de parallélisme, ignorés par le runner si le scraper ne les accepte pas
+                logger.info(f"Mode parallèle: {'activé' if args.parallel else 'désactivé'} avec {args.workers} workers")
+                items = run_scraper(scraper, url, use_parallel=args.parallel, max_workers=args.workers, city=ville)
                 
                 # Ajouter la ville aux résultats
                 for item in items:
@@ -114,12 +116,9 @@ def main():
                 logger.info(f"Scraping pour {scraper_source['url']} avec {args.scraper}")
                 scraper = load_scraper(args.scraper)
                 
-                # Utiliser les paramètres de parallélisme si disponibles
-                if hasattr(scraper, "scrape") and "use_parallel" in scraper.scrape.__code__.co_varnames:
-                    logger.info(f"Mode parallèle: {'activé' if args.parallel else 'désactivé'} avec {args.workers} workers")
-                    items = run_scraper(scraper, scraper_source["url"], use_parallel=args.parallel, max_workers=args.workers)
-                else:
-                    items = run_scraper(scraper, scraper_source["url"])
+                # Paramètres de parallélisme, ignorés par le runner si le scraper ne les accepte pas
+                logger.info(f"Mode parallèle: {'activé' if args.parallel else 'désactivé'} avec {args.workers} workers")
+                items = run_scraper(scraper, scraper_source["url"], use_parallel=args.parallel, max_workers=args.workers)
                 
                 # Sauvegarder les résultats
                 save_results(items, "general")
@@ -132,6 +131,8 @@ def main():
                 
     except Exception as e:
         logger.exception(f"Erreur lors de l'exécution: {str(e)}")
+    finally:
+        close_browser_pool()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+
+from utils.output import iter_json_array
+
+ITEMS = [
+    {"company_RC": "000001", "rating": 4.5, "social_networks": []},
+    12345,
+    -0.25,
+    1e-3,
+    True,
+    False,
+    None,
+    "texte, avec ] délimiteurs",
+    [1, [2, 3]],
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_array_chunk_boundaries(chunk_size, indent):
+    text = json.dumps(ITEMS, indent=indent, ensure_ascii=False)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == ITEMS
+
+
+def test_iter_json_array_scalar_at_end_of_file():
+    assert list(iter_json_array(io.StringIO("[12345]"), chunk_size=1)) == [12345]
+
+
+@pytest.mark.parametrize("text", ["[1.", "[12", "[1x]", "[tru"])
+def test_iter_json_array_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=1))
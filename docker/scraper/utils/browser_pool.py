@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from utils.metrics import registry, timed
+from utils.ratelimit import get_domain_limiter
+
+logger = logging.getLogger(__name__)
+
+# Nombre de pages servies par un navigateur avant son recyclage
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+
+
+class BrowserPool:
+    """
+    Pool de navigateurs furtifs (Camoufox via scrapling) gardés au chaud.
+
+    Chaque emplacement du pool est un thread qui possède sa propre session
+    navigateur (les objets Playwright synchrones ne peuvent pas changer de
+    thread) et traite les requêtes de la file partagée. Une session est
+    recyclée après `max_pages` pages ou dès qu'une requête échoue.
+    """
+
+    def __init__(self, size=4, max_pages=BROWSER_MAX_PAGES, **session_options):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.session_options = {"headless": True, **session_options}
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._busy = 0
+        self._browsers_started = 0
+        self._browsers_recycled = 0
+        self._pages_served = 0
+        self._failures = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"browser-{i}", daemon=True)
+            for i in range(self.size)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, url, **fetch_options) -> Future:
+        """Met en file le chargement de `url` et retourne un Future de la page"""
+        if self._closed:
+            raise RuntimeError("Le pool de navigateurs est fermé")
+        future = Future()
+        self._jobs.put((future, url, fetch_options))
+        return future
+
+    def fetch(self, url, **fetch_options):
+        """Charge `url` dans un navigateur du pool et retourne la page"""
+        return self.submit(url, **fetch_options).result()
+
+    def _start_session(self):
+        try:
+            from scrapling.fetchers import StealthySession
+        except ImportError:
+            # Ancienne version de scrapling : pas de session réutilisable
+            return None
+        session = StealthySession(**self.session_options)
+        session.start()
+        return session
+
+    def _fetch(self, session, url, fetch_options):
+        # Politesse par domaine, commune à tous les navigateurs du processus
+        limiter = get_domain_limiter(url)
+        if limiter:
+            limiter.acquire()
+        with timed("fetch"):
+            if session is None:
+                from scrapling.fetchers import StealthyFetcher
+                StealthyFetcher.auto_match = True
+                return StealthyFetcher.fetch(url, **self.session_options, **fetch_options)
+            return session.fetch(url, **fetch_options)
+
+    @staticmethod
+    def _close_session(session):
+        if session is None:
+            return
+        try:
+            session.close()
+        except Exception as e:
+            logger.debug(f"Fermeture du navigateur en erreur: {e}")
+
+    def _worker(self):
+        session = None
+        started = False
+        pages = 0
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, url, fetch_options = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            with self._lock:
+                self._busy += 1
+            try:
+                if not started:
+                    session = self._start_session()
+                    started = True
+                    pages = 0
+                    with self._lock:
+                        self._browsers_started += 1
+                page = self._fetch(session, url, fetch_options)
+                pages += 1
+                with self._lock:
+                    self._pages_served += 1
+                future.set_result(page)
+            except Exception as e:
+                logger.warning(f"Échec du navigateur pour {url}: {e}; recyclage de la session")
+                with self._lock:
+                    self._failures += 1
+                # Une session en erreur (crash, page bloquée...) n'est pas réutilisée
+                pages = self.max_pages
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+            if started and pages >= self.max_pages:
+                self._close_session(session)
+                session = None
+                started = False
+                with self._lock:
+                    self._browsers_recycled += 1
+
+        self._close_session(session)
+
+    def stats(self):
+        """Statistiques d'utilisation du pool"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "busy": self._busy,
+                "queued": self._jobs.qsize(),
+                "utilisation": self._busy / self.size,
+                "browsers_started": self._browsers_started,
+                "browsers_recycled": self._browsers_recycled,
+                "pages_served": self._pages_served,
+                "failures": self._failures,
+            }
+
+    def close(self):
+        """Arrête les threads du pool et ferme les navigateurs"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(timeout=30)
+        logger.info(f"Pool de navigateurs fermé: {self.stats()}")
+
+
+class AsyncBrowser:
+    """
+    Navigateur furtif unique piloté par la boucle asyncio de core.runner.
+
+    Au lieu d'un thread bloqué par navigateur (BrowserPool), les pages sont
+    des onglets d'une même session asynchrone : jusqu'à `max_pages`
+    chargements simultanés, limités par un sémaphore, tous jobs confondus.
+    """
+
+    def __init__(self, max_pages=16, **session_options):
+        self.max_pages = max(1, max_pages)
+        self.session_options = {"headless": True, **session_options}
+        self._session = None
+        # Créés à la première utilisation, dans la boucle qui les utilise
+        self._semaphore = None
+        self._start_lock = None
+        self._in_flight = 0
+        self._pages_served = 0
+        self._failures = 0
+
+    async def _start_session(self):
+        async with self._start_lock:
+            if self._session is None:
+                from scrapling.fetchers import AsyncStealthySession
+                session = AsyncStealthySession(max_pages=self.max_pages, **self.session_options)
+                await session.start()
+                self._session = session
+        return self._session
+
+    async def fetch(self, url, **fetch_options):
+        """Charge `url` dans un onglet du navigateur et retourne la page"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+            self._start_lock = asyncio.Lock()
+        async with self._semaphore:
+            session = await self._start_session()
+            # Politesse par domaine, commune avec les navigateurs synchrones
+            limiter = get_domain_limiter(url)
+            if limiter:
+                await limiter.acquire_async()
+            self._in_flight += 1
+            try:
+                with timed("fetch"):
+                    page = await session.fetch(url, **fetch_options)
+                self._pages_served += 1
+                return page
+            except Exception:
+                self._failures += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+    def stats(self):
+        """Statistiques d'utilisation du navigateur"""
+        return {
+            "max_pages": self.max_pages,
+            "in_flight": self._in_flight,
+            "utilisation": self._in_flight / self.max_pages,
+            "pages_served": self._pages_served,
+            "failures": self._failures,
+        }
+
+    async def close(self):
+        """Ferme la session navigateur"""
+        if self._session is None:
+            return
+        try:
+            await self._session.close()
+        except Exception as e:
+            logger.debug(f"Fermeture du navigateur asynchrone en erreur: {e}")
+        self._session = None
+        logger.info(f"Navigateur asynchrone fermé: {self.stats()}")
+
+# Instance globale du pool (partagée par tous les jobs du processus)
+browser_pool = None
+_browser_pool_lock = threading.Lock()
+# Options appliquées à la création de l'instance globale
+browser_pool_options = {}
+# Navigateur asynchrone global (scrapers asynchrones, --async-pages)
+async_browser = None
+async_browser_options = {}
+
+def _pool_stat(name):
+    pool = browser_pool
+    return pool.stats()[name] if pool else 0
+
+registry.gauge("scraper_browser_pool_size", "Navigateurs du pool", lambda: _pool_stat("size"))
+registry.gauge("scraper_browser_pool_busy", "Navigateurs du pool occupés", lambda: _pool_stat("busy"))
+registry.gauge("scraper_browser_pool_queued", "Requêtes en attente d'un navigateur", lambda: _pool_stat("queued"))
+registry.gauge("scraper_browser_pool_recycled", "Navigateurs recyclés depuis le démarrage", lambda: _pool_stat("browsers_recycled"))
+registry.gauge("scraper_async_pages_in_flight", "Pages en cours de chargement dans le navigateur asynchrone",
+               lambda: async_browser.stats()["in_flight"] if async_browser else 0)
+
+def configure_browser_pool(**options):
+    """Définit les options du pool de navigateurs global (avant sa création)"""
+    browser_pool_options.update(options)
+
+def get_browser_pool():
+    """Retourne le pool de navigateurs, en le créant si nécessaire"""
+    global browser_pool
+    with _browser_pool_lock:
+        if browser_pool is None:
+            browser_pool = BrowserPool(**browser_pool_options)
+        return browser_pool
+
+def close_browser_pool():
+    """Ferme le pool de navigateurs global"""
+    global browser_pool
+    if browser_pool:
+        browser_pool.close()
+        browser_pool = None
+
+def configure_async_browser(**options):
+    """Définit les options du navigateur asynchrone global (avant sa création)"""
+    async_browser_options.update(options)
+
+def get_async_browser():
+    """Retourne le navigateur asynchrone, en le créant si nécessaire"""
+    global async_browser
+    with _browser_pool_lock:
+        if async_browser is None:
+            async_browser = AsyncBrowser(**async_browser_options)
+        return async_browser
+
+async def close_async_browser():
+    """Ferme le navigateur asynchrone global (coroutine, à exécuter dans sa boucle)"""
+    global async_browser
+    if async_browser:
+        await async_browser.close()
+        async_browser = None
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCache:
+    """
+    Cache clé/valeur persistant sur disque (SQLite) avec expiration (TTL)
+    et taille bornée (éviction LRU). Les valeurs sont stockées en JSON.
+
+    Utilisable depuis plusieurs threads : une seule connexion protégée par un verrou.
+    """
+
+    def __init__(self, path, table="cache", ttl=None, max_entries=None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Nombre d'écritures depuis la dernière éviction
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT,"
+            " expires_at REAL,"
+            " accessed_at REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+
+    def get(self, key, default=None):
+        """Retourne la valeur associée à `key`, ou `default` si absente ou expirée"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return default
+            self.hits += 1
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """Enregistre `value` pour `key` ; `ttl` (secondes) remplace le TTL par défaut"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            self._writes += 1
+            if self.max_entries and self._writes >= max(1, self.max_entries // 100):
+                self._writes = 0
+                self._evict()
+
+    def delete(self, key):
+        """Supprime l'entrée `key` si elle existe"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées au-delà de max_entries"""
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (time.time(),),
+        )
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            logger.debug(f"Cache {self.table}: {overflow} entrées évincées (LRU)")
+
+    def items(self):
+        """Itère sur les couples (clé, valeur) non expirés"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM {self.table} WHERE expires_at IS NULL OR expires_at >= ?",
+                (time.time(),),
+            ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        """Compteurs de hits/misses du cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        """Supprime toutes les entrées"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
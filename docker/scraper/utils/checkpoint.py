@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from utils.places import place_key
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "output/checkpoints")
+
+
+class CheckpointJournal:
+    """
+    Journal de reprise d'une exécution (JSON Lines, en ajout seul).
+
+    Événements enregistrés, par job (source/ville) :
+    - `enriched` : restaurant géocodé et enrichi (avec ses données) ;
+    - `delivered` : restaurant livré à Kafka ;
+    - `batch_done` : lot d'enrichissement d'un job réparti (--fanout) terminé ;
+    - `job_done` : ville entièrement traitée.
+
+    Au redémarrage avec le même identifiant d'exécution, les villes terminées
+    sont ignorées, les restaurants livrés ne sont pas réémis et les
+    restaurants déjà enrichis reprennent leurs données sans navigateur.
+    """
+
+    def __init__(self, run_id, directory=CHECKPOINT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"run_{run_id}.jsonl")
+        self.completed = {}
+        self.enriched = {}
+        self.delivered = {}
+        # Lots terminés des jobs répartis : job -> {numéro de lot: nombre d'éléments}
+        self.batches = {}
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    continue
+                job = entry["job"]
+                if entry["event"] == "job_done":
+                    self.completed[job] = entry.get("count", 0)
+                elif entry["event"] == "enriched":
+                    self.enriched.setdefault(job, {})[entry["key"]] = entry["item"]
+                elif entry["event"] == "delivered":
+                    self.delivered.setdefault(job, set()).add(entry["key"])
+                elif entry["event"] == "batch_done":
+                    self.batches.setdefault(job, {})[entry["batch"]] = entry.get("count", 0)
+        # Les restaurants livrés n'ont plus besoin de leurs données enrichies
+        for job, keys in self.delivered.items():
+            enriched = self.enriched.get(job, {})
+            for key in keys:
+                enriched.pop(key, None)
+        logger.info(
+            f"Reprise depuis {self.path}: {len(self.completed)} jobs terminés, "
+            f"{sum(len(keys) for keys in self.delivered.values())} restaurants déjà livrés"
+        )
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def is_done(self, job):
+        return job in self.completed
+
+    def record_enriched(self, job, item):
+        key = place_key(item)
+        if key:
+            # La date d'enrichissement évite un nouvel enrichissement à la reprise
+            item = dict(item, _enriched_at=item.get("_enriched_at") or time.time())
+            self._write({"event": "enriched", "job": job, "key": key, "item": item})
+
+    def record_delivered(self, job, item):
+        key = place_key(item)
+        if key:
+            self._write({"event": "delivered", "job": job, "key": key})
+
+    def record_done(self, job, count):
+        self._write({"event": "job_done", "job": job, "count": count})
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self.completed[job] = count
+
+    def record_batch_done(self, job, batch, batches, count):
+        """
+        Enregistre le lot `batch` (sur `batches`) d'un job réparti. Le job est
+        terminé avec son dernier lot ; un lot redistribué n'est compté qu'une fois.
+        """
+        self._write({"event": "batch_done", "job": job, "batch": batch, "batches": batches, "count": count})
+        with self._lock:
+            done = self.batches.setdefault(job, {})
+            done[batch] = count
+            finished = len(done) >= batches and job not in self.completed
+            if finished:
+                # Réservé sous le verrou : un seul worker termine le job
+                self.completed[job] = sum(done.values())
+        if finished:
+            self.record_done(job, self.completed[job])
+
+    def resume(self, job, restaurants):
+        """
+        Filtre les restaurants d'un job repris : ignore ceux déjà livrés et
+        remplace ceux déjà enrichis par leurs données journalisées.
+        """
+        delivered = self.delivered.get(job, set())
+        enriched = self.enriched.get(job, {})
+        if not delivered and not enriched:
+            yield from restaurants
+            return
+        skipped = resumed = 0
+        for restaurant in restaurants:
+            key = place_key(restaurant)
+            if key in delivered:
+                skipped += 1
+                continue
+            if key in enriched:
+                resumed += 1
+                restaurant = enriched[key]
+            yield restaurant
+        logger.info(f"Reprise de {job}: {skipped} restaurants déjà livrés ignorés, {resumed} enrichissements repris")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# Journal global (None tant que le checkpointing n'est pas activé)
+journal = None
+# Job en cours dans le thread ou la tâche asyncio courante
+_current = ContextVar("checkpoint_job", default=None)
+
+def configure_checkpoint(run_id, directory=CHECKPOINT_DIR):
+    """Active le checkpointing pour l'exécution `run_id`"""
+    global journal
+    journal = CheckpointJournal(run_id, directory)
+    return journal
+
+def get_checkpoint():
+    return journal
+
+@contextmanager
+def current_job(job):
+    """
+    Associe le thread courant au job `job` (pour resume_current/record_*).
+    Les coroutines lancées par core.runner héritent de ce contexte.
+    """
+    token = _current.set(job)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def _job():
+    return _current.get()
+
+def resume_current(restaurants):
+    """Applique la reprise du job courant, ou renvoie les restaurants tels quels"""
+    if journal is None or _job() is None:
+        return restaurants
+    return journal.resume(_job(), restaurants)
+
+def record_enriched(item):
+    if journal is not None and _job() is not None:
+        journal.record_enriched(_job(), item)
+
+def record_delivered(item):
+    if journal is not None and _job() is not None:
+        journal.record_delivered(_job(), item)
+
+def close_checkpoint():
+    global journal
+    if journal:
+        journal.close()
+        journal = None
@@ -0,0 +1,121 @@
+"""
+Index des lieux déjà vus pendant l'exécution, toutes villes et sources
+confondues : les recherches qui se recouvrent (« restaurant Rabat » et
+« restaurant Salé », ou la même requête dans deux sources) ne géocodent,
+n'enrichissent et ne publient chaque lieu qu'une fois.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from utils.metrics import DUPLICATES, registry
+from utils.places import place_key
+
+logger = logging.getLogger(__name__)
+
+# Activé par défaut (DEDUP=0 ou --no-dedup pour le désactiver)
+enabled = os.getenv("DEDUP", "1") == "1"
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "1000000"))
+
+
+def _digest(key):
+    """Empreinte de 64 bits de la clé du lieu (collisions négligeables à cette échelle)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SeenIndex:
+    """
+    Lieux vus pendant l'exécution : empreinte de place_key() -> job qui l'a
+    vu le premier. Borné à `max_entries` entrées, les plus anciennes étant
+    oubliées au-delà.
+
+    Un lieu reste attribué à son premier job : relancer ce job (reprise,
+    tâche retentée par la file de travail) ne le compte pas comme doublon.
+    """
+
+    def __init__(self, max_entries=DEDUP_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._owners = {}
+        # Job -> petit entier, pour ne pas garder une chaîne par entrée
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, key, job):
+        """Vrai si le lieu est nouveau ou déjà attribué à `job`, faux si c'est un doublon"""
+        digest = _digest(key)
+        with self._lock:
+            job_id = self._jobs.setdefault(job, len(self._jobs))
+            owner = self._owners.get(digest)
+            if owner is None:
+                self._owners[digest] = job_id
+                if len(self._owners) > self.max_entries:
+                    # Dictionnaire ordonné par insertion : la première entrée est la plus ancienne
+                    del self._owners[next(iter(self._owners))]
+                return True
+            if owner == job_id:
+                return True
+            self.duplicates += 1
+            return False
+
+    def __len__(self):
+        return len(self._owners)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._owners), "jobs": len(self._jobs), "duplicates": self.duplicates}
+
+
+# Index global (partagé par tous les jobs du processus)
+seen_index = None
+_seen_index_lock = threading.Lock()
+
+registry.gauge("scraper_dedup_entries", "Lieux retenus par l'index de dédoublonnage",
+               lambda: len(seen_index) if seen_index else 0)
+
+
+def configure_dedup(enable=True, max_entries=DEDUP_MAX_ENTRIES):
+    """Active ou désactive le dédoublonnage (avant la première ville)"""
+    global enabled, seen_index
+    with _seen_index_lock:
+        enabled = enable
+        seen_index = SeenIndex(max_entries) if enable else None
+
+
+def get_seen_index():
+    """Retourne l'index des lieux vus, en le créant si nécessaire (None si désactivé)"""
+    global seen_index
+    if not enabled:
+        return None
+    with _seen_index_lock:
+        if seen_index is None:
+            seen_index = SeenIndex()
+        return seen_index
+
+
+def drop_duplicates(restaurants, job, city=None):
+    """
+    Retire les lieux déjà vus par un autre job de l'exécution, ainsi que les
+    doublons de la liste elle-même. `job` identifie la recherche (son URL).
+    """
+    index = get_seen_index()
+    if index is None:
+        return restaurants
+    kept = []
+    listed = set()
+    duplicates = 0
+    for restaurant in restaurants:
+        key = place_key(restaurant)
+        if key is None:
+            kept.append(restaurant)
+            continue
+        if key in listed or not index.claim(key, job):
+            duplicates += 1
+            continue
+        listed.add(key)
+        kept.append(restaurant)
+    if duplicates:
+        DUPLICATES.inc(duplicates, city=city or "unknown_city")
+        logger.info(f"{city or job}: {duplicates} lieux déjà vus ignorés, {len(kept)} restants")
+    return kept
@@ -0,0 +1,166 @@
+"""
+Cache persistant des résultats d'enrichissement (recherche Google), indexé
+par nom de restaurant et ville normalisés.
+
+    python -m utils.enrichcache stats
+    python -m utils.enrichcache export enrichment.jsonl
+    python -m utils.enrichcache import enrichment.jsonl
+    python -m utils.enrichcache warm "output/*.json" "output/*.jsonl*"
+    python -m utils.enrichcache purge-negative
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+
+from utils.cache import SQLiteCache
+from utils.metrics import register_cache
+from utils.output import iter_records
+
+ENRICH_CACHE_PATH = os.getenv("ENRICH_CACHE_PATH", "output/enrichment_cache.sqlite")
+ENRICH_CACHE_TTL = float(os.getenv("ENRICH_CACHE_TTL_DAYS", "30")) * 86400
+# Recherches sans résultat ou en échec : retentées plus tôt
+ENRICH_CACHE_NEGATIVE_TTL = float(os.getenv("ENRICH_CACHE_NEGATIVE_TTL_DAYS", "2")) * 86400
+ENRICH_CACHE_MAX_ENTRIES = int(os.getenv("ENRICH_CACHE_MAX_ENTRIES", "200000"))
+
+# Numéro par défaut de utils.parser, à ne pas confondre avec un vrai numéro
+PLACEHOLDER_PHONE = "12345676543"
+
+enrichment_cache = None
+_enrichment_cache_lock = threading.Lock()
+
+
+def get_enrichment_cache() -> SQLiteCache:
+    """Retourne le cache d'enrichissement, en le créant si nécessaire"""
+    global enrichment_cache
+    with _enrichment_cache_lock:
+        if enrichment_cache is None:
+            enrichment_cache = SQLiteCache(
+                ENRICH_CACHE_PATH,
+                table="enrichment",
+                ttl=ENRICH_CACHE_TTL,
+                max_entries=ENRICH_CACHE_MAX_ENTRIES,
+            )
+            register_cache("enrichment", enrichment_cache)
+        return enrichment_cache
+
+
+def purge_negative(cache=None):
+    """Supprime les résultats vides ou en échec ; retourne leur nombre"""
+    cache = get_enrichment_cache() if cache is None else cache
+    keys = [key for key, value in cache.items() if not value["found"]]
+    for key in keys:
+        cache.delete(key)
+    return len(keys)
+
+
+def normalize(text):
+    """Minuscules, sans accents ni ponctuation, espaces réduits"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def enrichment_key(name, city=None):
+    return f"{normalize(name)}|{normalize(city)}"
+
+
+def is_found(data):
+    """Vrai si l'enrichissement a trouvé au moins une information"""
+    return any(data.get(field) for field in ("telephone", "site_web", "reseaux_sociaux"))
+
+
+def cache_enrichment(key, data, cache=None):
+    """Enregistre un résultat, avec le TTL court des résultats vides"""
+    cache = get_enrichment_cache() if cache is None else cache
+    found = is_found(data)
+    cache.set(key, {"found": found, "data": data}, ttl=None if found else ENRICH_CACHE_NEGATIVE_TTL)
+
+
+def warm_from_outputs(paths, cache=None):
+    """
+    Préremplit le cache à partir des fichiers de sortie des exécutions
+    précédentes (output/*.json, *.jsonl[.gz|.zst], *.parquet). Seuls les
+    résultats non vides sont repris. Retourne le nombre d'entrées ajoutées.
+    """
+    cache = get_enrichment_cache() if cache is None else cache
+    count = 0
+    for path in paths:
+        for payload in iter_records(path):
+            phone = payload.get("phone_number")
+            data = {
+                "telephone": phone if phone != PLACEHOLDER_PHONE else None,
+                "site_web": payload.get("website"),
+                "reseaux_sociaux": payload.get("social_networks") or [],
+            }
+            if not payload.get("company_name") or not is_found(data):
+                continue
+            city = (payload.get("address") or {}).get("city")
+            cache_enrichment(enrichment_key(payload["company_name"], city), data, cache)
+            count += 1
+    return count
+
+
+def export_entries(path, cache=None):
+    """Exporte les entrées non expirées en JSON Lines ; retourne leur nombre"""
+    cache = get_enrichment_cache() if cache is None else cache
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for key, value in cache.items():
+            f.write(json.dumps({"key": key, **value}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def import_entries(path, cache=None):
+    """Importe un export JSON Lines (TTL recalculé à l'import) ; retourne le nombre d'entrées"""
+    cache = get_enrichment_cache() if cache is None else cache
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            cache_enrichment(entry["key"], entry["data"], cache)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache des résultats d'enrichissement")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Nombre d'entrées, positives et négatives")
+    export = commands.add_parser("export", help="Exporte le cache en JSON Lines")
+    export.add_argument("file")
+    load = commands.add_parser("import", help="Importe un export JSON Lines")
+    load.add_argument("file")
+    warm = commands.add_parser("warm", help="Préremplit le cache depuis les fichiers output/*.json[l]")
+    warm.add_argument("files", nargs="+")
+    commands.add_parser("purge-negative", help="Supprime les résultats vides ou en échec")
+    args = parser.parse_args()
+
+    cache = get_enrichment_cache()
+    if args.command == "stats":
+        found = sum(1 for _, value in cache.items() if value["found"])
+        print(f"{len(cache)} entrées : {found} positives, {len(cache) - found} négatives ou expirées")
+    elif args.command == "export":
+        print(f"{export_entries(args.file, cache)} entrées exportées dans {args.file}")
+    elif args.command == "import":
+        print(f"{import_entries(args.file, cache)} entrées importées depuis {args.file}")
+    elif args.command == "warm":
+        paths = [path for pattern in args.files for path in sorted(glob.glob(pattern))]
+        print(f"{warm_from_outputs(paths, cache)} entrées ajoutées depuis {len(paths)} fichiers")
+    elif args.command == "purge-negative":
+        print(f"{purge_negative(cache)} entrées négatives supprimées")
+    cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
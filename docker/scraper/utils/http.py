@@ -0,0 +1,36 @@
+import threading
+
+# Sessions HTTP partagées, une par nom (connexions keep-alive réutilisées)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(pool_size=10, retries=2, headers=None):
+    """Crée une session requests avec un pool de connexions et des relances"""
+    # Importés à la première session : inutiles au démarrage
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_http_session(name="default", **options):
+    """Retourne la session partagée `name`, en la créant si nécessaire"""
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _sessions[name] = create_session(**options)
+        return session
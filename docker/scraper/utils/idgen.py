@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+from utils.places import place_key
+
+logger = logging.getLogger(__name__)
+
+# Fichier du compteur partagé : contient le prochain identifiant libre
+COUNTER_FILE = os.getenv("ID_COUNTER_FILE", "output/counter.txt")
+# Nombre d'identifiants réservés à chaque accès au fichier
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))
+# "counter" : compteur incrémental, "content" : identifiant dérivé de la fiche Maps
+ID_MODE = os.getenv("ID_MODE", "counter")
+
+
+class BlockIdAllocator:
+    """
+    Générateur d'identifiants incrémentaux qui réserve des blocs d'identifiants
+    dans le fichier compteur (sous verrou exclusif), puis les distribue depuis
+    la mémoire. Plusieurs threads et processus peuvent l'utiliser sans doublon ;
+    les identifiants non utilisés d'un bloc sont perdus à l'arrêt.
+    """
+
+    def __init__(self, counter_file=COUNTER_FILE, block_size=ID_BLOCK_SIZE):
+        self.counter_file = counter_file
+        self.block_size = max(1, block_size)
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self):
+        directory = os.path.dirname(self.counter_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.counter_file, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                content = f.read().strip()
+                start = int(content) if content else 1
+                f.seek(0)
+                f.truncate()
+                f.write(str(start + self.block_size))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        self._next, self._end = start, start + self.block_size
+        logger.debug(f"Bloc d'identifiants réservé: {start}-{self._end - 1}")
+
+    def next_id(self):
+        """Retourne le prochain identifiant, formaté sur 6 chiffres"""
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            value = self._next
+            self._next += 1
+        return f"{value:06d}"
+
+
+def content_id(item):
+    """
+    Identifiant déterministe dérivé de la fiche Maps (identifiant de fiche,
+    sinon coordonnées + nom) : un même lieu garde le même company_RC d'une
+    exécution à l'autre. Retourne None si le lieu n'est pas identifiable.
+    """
+    key = place_key(item)
+    if not key:
+        return None
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# Instance globale du générateur
+id_allocator = None
+_id_allocator_lock = threading.Lock()
+
+def get_id_allocator():
+    """Retourne le générateur d'identifiants, en le créant si nécessaire"""
+    global id_allocator
+    with _id_allocator_lock:
+        if id_allocator is None:
+            id_allocator = BlockIdAllocator()
+        return id_allocator
+
+def configure_id_mode(mode):
+    """Choisit le mode d'identifiant : "counter" ou "content" """
+    global ID_MODE
+    if mode not in ("counter", "content"):
+        raise ValueError(f"Mode d'identifiant inconnu: {mode}")
+    ID_MODE = mode
+
+def next_id(item=None):
+    """Identifiant unique pour un élément, selon le mode configuré"""
+    if ID_MODE == "content" and item is not None:
+        derived = content_id(item)
+        if derived:
+            return derived
+    return get_id_allocator().next_id()
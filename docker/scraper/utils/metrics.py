@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{str(value)}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    """Compteur cumulatif, éventuellement étiqueté"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        for key, value in self.snapshot().items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Histogramme cumulatif (format Prometheus), éventuellement étiqueté"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: {"buckets": list(series["buckets"]), "sum": series["sum"], "count": series["count"]}
+                for key, series in self._series.items()
+            }
+
+    def render(self):
+        for key, series in self.snapshot().items():
+            for bound, count in zip(self.buckets, series["buckets"]):
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, ('le', bound))} {count}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {series['count']}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {series['sum']}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}"
+
+
+class Gauge:
+    """
+    Jauge calculée à la lecture : `func` retourne une valeur, ou un dict
+    {tuple de valeurs d'étiquettes: valeur} pour une jauge étiquetée.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, func, labels=()):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labels = labels
+
+    def snapshot(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.debug(f"Jauge {self.name} indisponible: {e}")
+            return {}
+        if isinstance(value, dict):
+            return value
+        return {(): value}
+
+    def render(self):
+        for key, value in self.snapshot().items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Registry:
+    """Ensemble des métriques du processus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, func, labels=()):
+        with self._lock:
+            # Une jauge réenregistrée remplace la précédente (nouvelle source de valeurs)
+            metric = self._metrics[name] = Gauge(name, help, func, labels)
+            return metric
+
+    def render(self):
+        """Exposition au format texte Prometheus"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_DURATION = registry.histogram(
+    "scraper_stage_duration_seconds", "Durée des étages du pipeline", labels=("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "scraper_stage_errors_total", "Erreurs par étage du pipeline", labels=("stage",)
+)
+ITEMS_PROCESSED = registry.counter(
+    "scraper_items_total", "Éléments traités par ville", labels=("city",)
+)
+DUPLICATES = registry.counter(
+    "scraper_duplicates_total", "Lieux ignorés car déjà vus dans une autre recherche de l'exécution",
+    labels=("city",),
+)
+KAFKA_DELIVERY = registry.histogram(
+    "scraper_kafka_delivery_seconds", "Délai entre la mise en file et l'acquittement Kafka"
+)
+ENRICH_TIERS = registry.counter(
+    "scraper_enrich_tier_total", "Résultats de l'enrichissement par niveau (http, browser)",
+    labels=("tier", "outcome"),
+)
+
+def _tier_hit_ratios():
+    totals, hits = {}, {}
+    for (tier, outcome), value in ENRICH_TIERS.snapshot().items():
+        totals[tier] = totals.get(tier, 0) + value
+        if outcome == "hit":
+            hits[tier] = hits.get(tier, 0) + value
+    return {(tier,): hits.get(tier, 0) / total for tier, total in totals.items() if total}
+
+registry.gauge(
+    "scraper_enrich_tier_hit_ratio", "Part des enrichissements résolus par niveau",
+    _tier_hit_ratios, labels=("tier",),
+)
+
+# Caches suivis (nom -> objet exposant stats() avec hits, misses, hit_ratio)
+_caches = {}
+
+def register_cache(name, cache):
+    """Expose les compteurs de hits/misses d'un cache"""
+    _caches[name] = cache
+
+registry.gauge(
+    "scraper_cache_hit_ratio", "Taux de hits des caches",
+    lambda: {(name,): cache.stats()["hit_ratio"] for name, cache in list(_caches.items())},
+    labels=("cache",),
+)
+registry.gauge(
+    "scraper_cache_hits", "Hits des caches depuis le démarrage",
+    lambda: {(name,): cache.stats()["hits"] for name, cache in list(_caches.items())},
+    labels=("cache",),
+)
+registry.gauge(
+    "scraper_cache_misses", "Misses des caches depuis le démarrage",
+    lambda: {(name,): cache.stats()["misses"] for name, cache in list(_caches.items())},
+    labels=("cache",),
+)
+
+
+@contextmanager
+def timed(stage):
+    """Mesure la durée d'un étage (fetch, scroll, geocode, enrich, parse, kafka_send...)"""
+    start = time.monotonic()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.monotonic() - start, stage=stage)
+
+
+def _quantile(buckets, bounds, count, q):
+    """Quantile estimé à partir des compteurs cumulés d'un histogramme"""
+    if not count:
+        return 0.0
+    target = q * count
+    for bound, cumulated in zip(bounds, buckets):
+        if cumulated >= target:
+            return bound
+    return float("inf")
+
+
+def snapshot():
+    """Instantané des latences par étage et de livraison Kafka, pour city_summary()"""
+    stages = STAGE_DURATION.snapshot()
+    for key, series in KAFKA_DELIVERY.snapshot().items():
+        stages[("kafka_delivery",) + key] = series
+    return stages
+
+
+def city_summary(city, before):
+    """
+    Résumé des étages depuis l'instantané `before` (début de la ville).
+    Avec plusieurs villes en parallèle, les étages des autres villes en cours
+    sur la même période sont inclus.
+    """
+    lines = [f"Métriques pour {city} :"]
+    empty = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+    for key, series in sorted(snapshot().items()):
+        previous = before.get(key, empty)
+        count = series["count"] - previous["count"]
+        if not count:
+            continue
+        total = series["sum"] - previous["sum"]
+        buckets = [now - then for now, then in zip(series["buckets"], previous["buckets"])]
+        p95 = _quantile(buckets, LATENCY_BUCKETS, count, 0.95)
+        lines.append(f"  {key[0]:<14} {count:>6} ops  moy {total / count * 1000:>9.1f} ms  p95 ≤ {p95 * 1000:.0f} ms")
+    duplicates = DUPLICATES.snapshot().get((city,), 0)
+    if duplicates:
+        lines.append(f"  doublons ignorés = {duplicates:.0f}")
+    for name in ("scraper_browser_pool_busy", "scraper_cache_hit_ratio", "scraper_enrich_tier_hit_ratio"):
+        metric = registry._metrics.get(name)
+        if metric:
+            for key, value in metric.snapshot().items():
+                label = f"{name}{_format_labels(metric.labels, key)}"
+                lines.append(f"  {label} = {value:.2f}")
+    return "\n".join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Expose /metrics au format Prometheus dans un thread en arrière-plan"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info(f"Métriques Prometheus exposées sur http://{host}:{port}/metrics")
+    return server
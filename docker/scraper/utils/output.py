@@ -0,0 +1,314 @@
+"""
+Fichiers de sortie par ville : JSON indenté (format historique, par défaut),
+JSON Lines éventuellement compressé (gzip, zstd) et instantané colonnaire
+Parquet.
+
+Le JSON indenté et Parquet contiennent le payload de parse_item. Les lignes
+JSON Lines sont les octets mêmes du message Kafka ou du document
+Elasticsearch (champs dérivés compris), sérialisés une seule fois.
+
+zstd et Parquet reposent sur des dépendances optionnelles
+(`pip install zstandard pyarrow`).
+"""
+import gzip
+import io
+import json
+import os
+
+from utils.record import Record, as_dict, encode, loads
+
+OUTPUT_DIR = "output"
+# Formats disponibles -> extension des fichiers
+FORMATS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "jsonl.gz": ".jsonl.gz",
+    "jsonl.zst": ".jsonl.zst",
+    "parquet": ".parquet",
+}
+# Lignes par groupe de lignes Parquet
+PARQUET_ROW_GROUP = 5000
+
+# Formats écrits par process_city_results / process_city_stream
+output_formats = ["json"]
+
+
+def configure_output(formats):
+    """Choisit les formats de sortie (liste ou chaîne séparée par des virgules)"""
+    global output_formats
+    if isinstance(formats, str):
+        formats = [fmt.strip() for fmt in formats.split(",") if fmt.strip()]
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Format de sortie inconnu : {fmt} (formats : {', '.join(FORMATS)})")
+        # Vérifie dès le démarrage que les dépendances optionnelles sont installées
+        if fmt == "jsonl.zst":
+            _zstandard()
+        elif fmt == "parquet":
+            _pyarrow()
+    output_formats = list(formats)
+
+
+def stream_formats():
+    """Formats en flux : le JSON indenté est remplacé par des JSON Lines, lisibles même interrompus"""
+    return list(dict.fromkeys("jsonl" if fmt == "json" else fmt for fmt in output_formats))
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Le format jsonl.zst nécessite le paquet zstandard (pip install zstandard)")
+    return zstandard
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Le format parquet nécessite le paquet pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+# Champs imbriqués de parse_item, aplatis en colonnes par flatten()
+NESTED_FIELDS = {
+    "address": ("address_line", "address_line2", "city", "country", "zip"),
+    "coordinates": ("lat", "lang"),
+}
+
+
+def flatten(payload):
+    """Ligne à plat d'un payload de parse_item (adresse et coordonnées en colonnes)"""
+    row = {key: value for key, value in payload.items() if key not in NESTED_FIELDS}
+    for field, columns in NESTED_FIELDS.items():
+        nested = payload.get(field) or {}
+        for column in columns:
+            row[column] = nested.get(column)
+    return row
+
+
+def unflatten(row):
+    """Inverse de flatten() : payload au format de parse_item"""
+    nested_columns = {column for columns in NESTED_FIELDS.values() for column in columns}
+    payload = {key: value for key, value in row.items() if key not in nested_columns}
+    for field, columns in NESTED_FIELDS.items():
+        payload[field] = {column: row.get(column) for column in columns}
+    return payload
+
+
+def parquet_schema():
+    """Schéma Arrow des payloads de parse_item (Record.FIELDS), aplatis par flatten()"""
+    pa = _pyarrow()
+    # Colonnes non textuelles ; les autres champs sont des chaînes
+    types = {"social_networks": pa.list_(pa.string()), "lat": pa.float64(), "lang": pa.float64()}
+    columns = []
+    for field in Record.FIELDS:
+        columns.extend(NESTED_FIELDS.get(field, (field,)))
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+class JSONArrayWriter:
+    """Tableau JSON indenté (format historique), écrit élément par élément"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        self.count = 0
+
+    def write(self, payload):
+        self._file.write(",\n  " if self.count else "\n  ")
+        text = json.dumps(as_dict(payload, derived=False), ensure_ascii=False, indent=2)
+        self._file.write(text.replace("\n", "\n  "))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.write("\n]" if self.count else "]")
+        self._file.close()
+
+
+class JSONLinesWriter:
+    """JSON Lines, non compressé, gzip ou zstd (octets de utils.record.encode, JSON compact)"""
+
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.count = 0
+        if compression == "gzip":
+            self._file = gzip.open(path, "wb")
+        elif compression == "zstd":
+            self._raw = open(path, "wb")
+            self._file = _zstandard().ZstdCompressor(level=10).stream_writer(self._raw)
+        else:
+            self._file = open(path, "wb")
+
+    def write(self, payload):
+        self._file.write(encode(payload))
+        self._file.write(b"\n")
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Instantané Parquet (compression zstd), écrit par groupes de lignes"""
+
+    def __init__(self, path, row_group=PARQUET_ROW_GROUP):
+        pa = _pyarrow()
+        self.path = path
+        self.count = 0
+        self._pa = pa
+        self._schema = parquet_schema()
+        self._writer = pa.parquet.ParquetWriter(path, self._schema, compression="zstd")
+        self._rows = []
+        self._row_group = row_group
+
+    def write(self, payload):
+        self._rows.append(flatten(as_dict(payload, derived=False)))
+        self.count += 1
+        if len(self._rows) >= self._row_group:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+def open_writer(fmt, path):
+    if fmt == "json":
+        return JSONArrayWriter(path)
+    if fmt == "jsonl":
+        return JSONLinesWriter(path)
+    if fmt == "jsonl.gz":
+        return JSONLinesWriter(path, compression="gzip")
+    if fmt == "jsonl.zst":
+        return JSONLinesWriter(path, compression="zstd")
+    if fmt == "parquet":
+        return ParquetWriter(path)
+    raise ValueError(f"Format de sortie inconnu : {fmt}")
+
+
+class CityOutput:
+    """
+    Fichiers de sortie d'une ville dans tous les formats configurés :
+    `output/{city}_{timestamp}{extension}`. Un fichier resté vide est supprimé
+    à la fermeture.
+    """
+
+    def __init__(self, city, timestamp, formats=None, directory=OUTPUT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.writers = [
+            open_writer(fmt, os.path.join(directory, f"{city}_{timestamp}{FORMATS[fmt]}"))
+            for fmt in (formats or output_formats)
+        ]
+
+    @property
+    def paths(self):
+        return [writer.path for writer in self.writers]
+
+    def write(self, payload):
+        for writer in self.writers:
+            writer.write(payload)
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+            if not writer.count:
+                os.remove(writer.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_text(path):
+    """Ouvre un fichier de sortie en texte, décompressé selon son extension"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        return io.TextIOWrapper(_zstandard().ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+CHUNK_SIZE = 1 << 16
+# Caractères qui terminent une valeur scalaire dans un tableau JSON
+SCALAR_END = frozenset(",] \t\r\n")
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """Itère sur les éléments d'un tableau JSON sans charger tout le fichier"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while not eof:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        pos = 0
+        while True:
+            # Espaces, crochet ouvrant et virgules entre les éléments
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Tableau JSON attendu, trouvé {buffer[pos]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Élément incomplet : attendre le bloc suivant
+                break
+            if not isinstance(item, (dict, list, str)) and not (end < len(buffer) and buffer[end] in SCALAR_END):
+                # Nombre, true/false/null : complet seulement devant un délimiteur
+                if eof:
+                    raise ValueError(f"Valeur JSON invalide à la position {pos}")
+                break
+            pos = end
+            yield item
+        buffer = buffer[pos:]
+    if started:
+        raise ValueError("Tableau JSON non terminé")
+
+
+def iter_records(path):
+    """Itère sur les payloads d'un fichier de sortie, quel que soit son format"""
+    if path.endswith(".parquet"):
+        parquet = _pyarrow().parquet.ParquetFile(path)
+        for batch in parquet.iter_batches():
+            for row in batch.to_pylist():
+                yield unflatten(row)
+        return
+    with open_text(path) as f:
+        if ".jsonl" in os.path.basename(path):
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        else:
+            yield from iter_json_array(f)
@@ -1,37 +1,27 @@
-import json
 import os
 import logging
 from datetime import datetime
-from utils.sender import send_to_kafka, close_kafka_sender
+from utils.checkpoint import get_checkpoint, record_delivered
+from utils.idgen import next_id
+from utils.metrics import ITEMS_PROCESSED, timed
+from utils.output import CityOutput, stream_formats
+from utils.postprocess import prepare_batch
+from utils.record import Record
+from utils.state import StateStore, get_state_store
+from utils.sender import flush_sink, get_sink, send_to_sink
 
-# Compteur pour les identifiants uniques
-COUNTER_FILE = "output/counter.txt"
+def get_next_id(item=None):
+    """Génère un identifiant unique (compteur incrémental commençant par 000001, ou dérivé de la fiche)"""
+    return next_id(item)
 
-def get_next_id():
-    """Génère un identifiant unique incrémental commençant par 000001"""
-    if not os.path.exists(COUNTER_FILE):
-        # Créer le répertoire si nécessaire
-        os.makedirs(os.path.dirname(COUNTER_FILE), exist_ok=True)
-        # Initialiser le compteur
-        with open(COUNTER_FILE, "w") as f:
-            f.write("1")
-        return "000001"
-    
-    with open(COUNTER_FILE, "r") as f:
-        counter = int(f.read().strip())
-    
-    # Incrémenter et sauvegarder
-    with open(COUNTER_FILE, "w") as f:
-        f.write(str(counter + 1))
-    
-    # Formater avec des zéros au début
-    return f"{counter:06d}"
-
-def parse_item(item):
+def parse_item(item) -> Record:
     """Transforme un élément scrapé au format requis"""
-    
-    # Générer un identifiant unique
-    unique_id = get_next_id()
+    with timed("parse"):
+        return _build_payload(item)
+
+def _build_payload(item):
+    # Générer un identifiant unique (ou conserver celui déjà attribué)
+    unique_id = item.get("company_RC") or get_next_id(item)
     
     # Extraire les coordonnées du scraper
     lat = float(item.get("latitude", 0)) if item.get("latitude") else 0
@@ -43,36 +33,71 @@ def parse_item(item):
         phone_number = "12345676543"
     
     # Construire le payload au format demandé
-    payload = {
-        "company_name": item.get("name", "Unknown"),
-        "company_RC": unique_id,
-        "address": {
+    return Record(
+        company_name=item.get("name", "Unknown"),
+        company_RC=unique_id,
+        address={
             "address_line": item.get("address", "test address"),
             "address_line2": "test address_line2",
             "city": item.get("city", "Lahore"),
             "country": "Maroc",
             "zip": "54000"
         },
-        "email": "test@test.com",
-        "phone_number": phone_number,
-        "language": "fr",
-        "coordinates": {
+        email="test@test.com",
+        phone_number=phone_number,
+        language="fr",
+        coordinates={
             "lat": lat,
             "lang": lng
         },
         # Ajouter les informations enrichies
-        "website": item.get("site_web"),
-        "social_networks": item.get("reseaux_sociaux", []),
-        "rating": item.get("rating"),
-        "review_count": item.get("review_count"),
-        "cuisine": item.get("cuisine"),
-        "price_range": item.get("price_range")
-    }
-    
-    return payload
+        website=item.get("site_web"),
+        social_networks=item.get("reseaux_sociaux", []),
+        rating=item.get("rating"),
+        review_count=item.get("review_count"),
+        cuisine=item.get("cuisine"),
+        price_range=item.get("price_range"),
+    )
 
-def process_city_results(items, city):
-    """Traite tous les résultats d'une ville et les sauvegarde dans un seul fichier"""
+def commit_published(pending, report):
+    """
+    Enregistre dans l'état local et dans le journal de reprise les éléments
+    dont la livraison a été confirmée par un acquittement. Un élément en échec
+    ou encore en attente au flush (délai dépassé) n'est pas enregistré : il
+    sera republié par l'exécution incrémentale suivante ou par la reprise.
+    """
+    state = get_state_store()
+    checkpoint = get_checkpoint()
+    if report.pending > 0:
+        logging.warning(f"{report.city}: {report.pending} éléments sans acquittement au flush, non enregistrés comme publiés")
+    for snapshot, company_rc, acknowledged in pending:
+        if company_rc not in report.confirmed:
+            continue
+        if state:
+            state.commit(snapshot, company_rc)
+        # Les envois synchrones ont été journalisés dès leur acquittement
+        if checkpoint and not acknowledged:
+            record_delivered(snapshot)
+
+def track_published(item, processed_item, published, acknowledged):
+    """
+    Retient un élément envoyé pour commit_published(). Un envoi déjà acquitté
+    (mode synchrone) est journalisé tout de suite, pour qu'une reprise après un
+    arrêt en cours de ville ne le réémette pas.
+    """
+    if not get_state_store() and not get_checkpoint():
+        return
+    snapshot = StateStore.snapshot(item)
+    if acknowledged:
+        record_delivered(snapshot)
+    published.append((snapshot, processed_item["company_RC"], acknowledged))
+
+def process_city_results(items, city, report_key=None):
+    """
+    Traite tous les résultats d'une ville et les sauvegarde (un fichier par
+    format de sortie). `report_key` identifie le job dans la destination
+    (rapport de livraison distinct pour deux jobs d'une même ville).
+    """
     if not items:
         logging.warning(f"Aucun résultat trouvé pour {city}")
         return
@@ -80,30 +105,95 @@ def process_city_results(items, city):
     # Créer le répertoire output s'il n'existe pas
     os.makedirs("output", exist_ok=True)
     
-    # Traiter chaque élément
+    pipelined = get_sink().pipelined
+    published = []
+    
+    # Transformer chaque élément
     processed_items = []
     for item in items:
         # Ajouter la ville si elle n'est pas déjà présente
         if "city" not in item:
             item["city"] = city
         
-        # Transformer l'élément
-        processed_item = parse_item(item)
-        processed_items.append(processed_item)
-        
-        # Envoyer à Kafka
-        if send_to_kafka(processed_item):
-            logging.info(f"Données envoyées à Kafka pour {processed_item['company_name']} (ID: {processed_item['company_RC']})")
+        processed_items.append(parse_item(item))
+        ITEMS_PROCESSED.inc(city=city)
+    
+    # Champs dérivés calculés pour toute la ville à la fois, puis envoi
+    for item, processed_item, outgoing in zip(items, processed_items, prepare_batch(processed_items)):
+        if send_to_sink(outgoing, city=city, report_key=report_key):
+            track_published(item, processed_item, published, not pipelined)
+            if pipelined:
+                logging.debug(f"Données mises en file pour Kafka: {processed_item['company_name']} (ID: {processed_item['company_RC']})")
+            else:
+                logging.info(f"Données envoyées à Kafka pour {processed_item['company_name']} (ID: {processed_item['company_RC']})")
         else:
             logging.error(f"Échec de l'envoi à Kafka pour {processed_item['company_RC']}")
     
-    # Sauvegarder tous les résultats dans un seul fichier JSON
+    # Attendre les acquittements de la ville (en mode pipeliné, c'est ici seulement qu'on attend)
+    report = flush_sink(city, report_key=report_key)
+    commit_published(published, report)
+    if report.failed:
+        logging.error(f"Livraison Kafka pour {city}: {report.delivered}/{report.queued} acquittés, {report.failed} échecs")
+    else:
+        logging.info(f"Livraison Kafka pour {city}: {report.delivered}/{report.queued} acquittés")
+    
+    # Sauvegarder tous les résultats dans un fichier par format de sortie
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f"output/{city}_{timestamp}.json"
+    with CityOutput(city, timestamp) as output:
+        for processed_item in processed_items:
+            output.write(processed_item)
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(processed_items, f, ensure_ascii=False, indent=2)
+    logging.info(f"Résultats sauvegardés dans {', '.join(output.paths)}: {len(processed_items)} éléments")
     
-    logging.info(f"Résultats sauvegardés dans {output_file}: {len(processed_items)} éléments")
+    return processed_items
+
+def process_city_stream(items, city, report_key=None):
+    """
+    Traite les résultats d'une ville au fil de l'eau : chaque élément est
+    transformé, envoyé à Kafka et ajouté aux fichiers de sortie (JSON Lines
+    par défaut) dès sa réception. `report_key` : voir process_city_results.
+    Retourne le nombre d'éléments traités.
+    """
+    os.makedirs("output", exist_ok=True)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    pipelined = get_sink().pipelined
+    published = []
+    count = 0
+    
+    with CityOutput(city, timestamp, stream_formats()) as output:
+        for item in items:
+            if "city" not in item:
+                item["city"] = city
+            
+            processed_item = parse_item(item)
+            ITEMS_PROCESSED.inc(city=city)
+            
+            outgoing, = prepare_batch([processed_item])
+            if send_to_sink(outgoing, city=city, report_key=report_key):
+                track_published(item, processed_item, published, not pipelined)
+                if pipelined:
+                    logging.debug(f"Données mises en file pour Kafka: {processed_item['company_name']} (ID: {processed_item['company_RC']})")
+                else:
+                    logging.info(f"Données envoyées à Kafka pour {processed_item['company_name']} (ID: {processed_item['company_RC']})")
+            else:
+                logging.error(f"Échec de l'envoi à Kafka pour {processed_item['company_RC']}")
+            
+            # Écriture incrémentale : un élément à la fois
+            output.write(processed_item)
+            output.flush()
+            count += 1
+    
+    report = flush_sink(city, report_key=report_key)
+    commit_published(published, report)
+    if report.failed:
+        logging.error(f"Livraison Kafka pour {city}: {report.delivered}/{report.queued} acquittés, {report.failed} échecs")
+    else:
+        logging.info(f"Livraison Kafka pour {city}: {report.delivered}/{report.queued} acquittés")
+    
+    if count:
+        logging.info(f"Résultats sauvegardés dans {', '.join(output.paths)}: {count} éléments")
+    else:
+        logging.warning(f"Aucun résultat trouvé pour {city}")
     
-    return processed_items 
\ No newline at end of file
+    return count
@@ -0,0 +1,42 @@
+import re
+
+# Identifiant de fiche Google Maps (« feature id ») et coordonnées dans l'URL
+PLACE_ID_PATTERN = re.compile(r'!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)')
+COORDINATES_PATTERN = re.compile(r'!3d([-\d\.]+)!4d([-\d\.]+)')
+
+
+def place_id_from_url(url):
+    """Extrait l'identifiant de fiche (0x...:0x...) d'une URL Google Maps"""
+    if not url:
+        return None
+    m = PLACE_ID_PATTERN.search(url)
+    return m.group(1).lower() if m else None
+
+
+def coordinates_from_url(url):
+    """Extrait les coordonnées (lat, lng) encodées par !3d!4d dans une URL Google Maps"""
+    if not url:
+        return None, None
+    m = COORDINATES_PATTERN.search(url)
+    return (m.group(1), m.group(2)) if m else (None, None)
+
+
+def place_key(item, precision=5):
+    """
+    Clé stable d'un lieu : identifiant de fiche Maps si disponible, sinon
+    coordonnées arrondies (avec le nom), sinon l'URL. Retourne None si le
+    lieu n'est pas identifiable.
+    """
+    url = item.get("url")
+    place_id = place_id_from_url(url)
+    if place_id:
+        return f"maps:{place_id}"
+
+    lat, lng = item.get("latitude"), item.get("longitude")
+    if not (lat and lng):
+        lat, lng = coordinates_from_url(url)
+    if lat and lng:
+        name = (item.get("name") or "").strip().lower()
+        return f"geo:{float(lat):.{precision}f},{float(lng):.{precision}f}:{name}"
+
+    return f"url:{url}" if url else None
@@ -0,0 +1,199 @@
+"""
+Champs dérivés calculés par lots dans le scraper, avant l'envoi : mêmes
+règles que les filtres de logstash/pipeline/kafka-elastic.conf et de
+vector/config/vector.toml, qui laissent passer tels quels les éléments
+marqués `scraper_enriched`.
+
+Les règles sont appliquées colonne par colonne sur tous les éléments d'un
+lot (expressions régulières précompilées, seuils par bisection), au lieu
+d'un traitement événement par événement dans l'étage d'ingestion.
+"""
+import bisect
+import os
+import re
+from datetime import datetime, timezone
+
+from utils.metrics import timed
+from utils.record import Record
+
+# Désactivable (--no-postprocess) pour laisser ces calculs à Logstash/Vector
+enabled = os.getenv("SCRAPER_POSTPROCESS", "1") == "1"
+
+RATING_THRESHOLDS = (3.0, 3.5, 4.0, 4.5)
+RATING_CATEGORIES = ("à améliorer", "moyen", "bon", "très bon", "excellent")
+POPULARITY_THRESHOLDS = (50, 100, 500)
+POPULARITY_CATEGORIES = ("peu connu", "modéré", "populaire", "très populaire")
+PRICE_CATEGORIES = {1: "économique", 2: "intermédiaire", 3: "élevé"}
+# Premier type dont un des motifs apparaît dans l'URL (même ordre que Logstash)
+SOCIAL_TYPES = (
+    ("facebook", ("facebook.com",)),
+    ("instagram", ("instagram.com",)),
+    ("twitter", ("twitter.com", "x.com")),
+    ("linkedin", ("linkedin.com",)),
+    ("youtube", ("youtube.com",)),
+)
+PLATFORM_DOMAINS = ("wix.com", "wordpress.com", "blogspot.com", "squarespace.com")
+ADDRESS_FIELDS = ("street", "district", "city", "province", "region", "postal_code", "country")
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+_MOROCCAN_PHONE = re.compile(r"^0[567]\d{8}$")
+_MAD = re.compile(r"MAD")
+_SCHEME = re.compile(r"^https?://")
+_WWW = re.compile(r"^www\.")
+# Équivalent du grok %{DATA:street}, ..., %{DATA:country} ; le pays prend le reste de l'adresse
+_ADDRESS = re.compile(r"^(.*?), (.*?), (.*?), (.*?), (.*?), (.*?), (.*)$")
+# Caractères arabes et tifinagh (amazigh)
+_ARABIC_AMAZIGH = re.compile(r"[\u0600-\u06FF\u2D30-\u2D7F]")
+
+
+def _to_float(value):
+    """Note Maps (« 4,5 ») en nombre, ou None"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _to_int(value):
+    """Nombre d'avis (« 1 234 », « (87) ») en entier, ou None"""
+    if value is None:
+        return None
+    digits = _NON_DIGITS.sub("", str(value))
+    return int(digits) if digits else None
+
+
+def _categorize(values, thresholds, labels):
+    return [labels[bisect.bisect_right(thresholds, value)] if value is not None else None for value in values]
+
+
+def _social_media(urls):
+    social_types = {}
+    for url in urls or []:
+        for name, patterns in SOCIAL_TYPES:
+            if any(pattern in url for pattern in patterns):
+                social_types[name] = url
+                break
+    return social_types
+
+
+def _website(url):
+    domain = _WWW.sub("", _SCHEME.sub("", url)).split("/")[0]
+    platform = any(platform in domain for platform in PLATFORM_DOMAINS)
+    return {
+        "website_domain": domain,
+        "website_secure": url.startswith("https://"),
+        "website_type": "plateforme" if platform else "domaine personnalisé",
+    }
+
+
+def _address_parts(address_line):
+    match = _ADDRESS.match(address_line) if isinstance(address_line, str) else None
+    if not match:
+        return {}
+    parts = dict(zip(ADDRESS_FIELDS, match.groups()))
+    for field in ("city", "province", "region", "country"):
+        parts[field] = _ARABIC_AMAZIGH.sub("", parts[field]).strip()
+    return parts
+
+
+def configure_postprocess(enable):
+    global enabled
+    enabled = enable
+
+
+def prepare_batch(payloads):
+    """Payloads à envoyer : enrichis par enrich_batch() si le post-traitement est activé"""
+    return enrich_batch(payloads) if enabled else payloads
+
+
+def enrich_batch(payloads):
+    """
+    Complète les payloads des champs dérivés (timestamp, location,
+    formatted_phone, social_media, catégories de note, de popularité et de
+    prix, site web, search_text, découpage de l'adresse) et les marque
+    `scraper_enriched`. Les Records de parse_item sont complétés sur place
+    (Record.derived, sans copie) ; un dictionnaire est remplacé par une copie
+    enrichie. Les éléments déjà marqués sont renvoyés tels quels.
+    """
+    with timed("postprocess"):
+        records = list(payloads)
+        pending = [i for i, record in enumerate(records) if not record.get("scraper_enriched")]
+        if not pending:
+            return records
+
+        timestamp = datetime.now(timezone.utc).isoformat()
+        batch = [records[i] for i in pending]
+        ratings = [_to_float(record.get("rating")) for record in batch]
+        rating_categories = _categorize(ratings, RATING_THRESHOLDS, RATING_CATEGORIES)
+        review_counts = [_to_int(record.get("review_count")) for record in batch]
+        popularity = _categorize(review_counts, POPULARITY_THRESHOLDS, POPULARITY_CATEGORIES)
+        phones = [_NON_DIGITS.sub("", str(record["phone_number"])) if record.get("phone_number") else None
+                  for record in batch]
+        price_levels = [len(_MAD.findall(price)) if isinstance(price, str) else 0
+                        for price in (record.get("price_range") for record in batch)]
+        social_media = [_social_media(record.get("social_networks")) for record in batch]
+
+        for n, (i, record) in enumerate(zip(pending, batch)):
+            derived = {"timestamp": record.get("timestamp") or timestamp}
+
+            coordinates = record.get("coordinates")
+            if coordinates:
+                lat, lon = coordinates.get("lat"), coordinates.get("lang")
+                derived["location"] = {"lat": lat, "lon": lon, "geo_point": f"{lat},{lon}"}
+
+            if phones[n] is not None:
+                derived["phone_number"] = phones[n]
+                if _MOROCCAN_PHONE.match(phones[n]):
+                    phone = phones[n]
+                    derived["formatted_phone"] = " ".join(phone[j:j + 2] for j in range(0, 10, 2))
+
+            derived["has_social_media"] = bool(social_media[n])
+            derived["social_media_count"] = len(social_media[n])
+            if social_media[n]:
+                derived["social_media"] = social_media[n]
+
+            if ratings[n] is not None:
+                derived["rating"] = ratings[n]
+                derived["rating_category"] = rating_categories[n]
+            if review_counts[n] is not None:
+                derived["review_count"] = review_counts[n]
+                derived["popularity"] = popularity[n]
+            if price_levels[n]:
+                derived["price_level"] = price_levels[n]
+                derived["price_category"] = PRICE_CATEGORIES.get(price_levels[n], "luxe")
+
+            if isinstance(record.get("website"), str):
+                derived.update(_website(record["website"]))
+
+            address = record.get("address") or {}
+            derived["search_text"] = " ".join(
+                str(value) for value in (record.get("company_name"), address.get("city"), record.get("cuisine")) if value
+            )
+            derived.update(_address_parts(address.get("address_line")))
+
+            derived["scraper_enriched"] = True
+            if isinstance(record, Record):
+                record.derived = derived
+            else:
+                record = dict(record)
+                if "location" in derived:
+                    record.pop("coordinates", None)
+                record.update(derived)
+                records[i] = record
+        return records
+
+
+def strip_derived(payload):
+    """
+    Payload de parse_item d'un élément relu dans un fichier de sortie : sans
+    les champs dérivés, `coordinates` reconstitué depuis `location`.
+    """
+    if not payload.get("scraper_enriched"):
+        return payload
+    raw = {field: payload.get(field) for field in Record.FIELDS}
+    location = payload.get("location")
+    if raw["coordinates"] is None and location:
+        raw["coordinates"] = {"lat": location.get("lat"), "lang": location.get("lon")}
+    return raw
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Limiteur de débit à seau de jetons, partagé entre threads.
+
+    `rate` jetons sont ajoutés par seconde, jusqu'à `capacity` (rafale autorisée).
+    acquire() bloque jusqu'à ce qu'un jeton soit disponible.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1):
+        """Attend qu'un jeton soit disponible et le consomme"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        """Variante de acquire() pour les coroutines : attend sans bloquer la boucle"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+# Limiteurs de politesse par domaine (requêtes/seconde), partagés par tout le processus
+_domain_rates = {}
+_domain_limiters = {}
+_domain_lock = threading.Lock()
+
+
+def configure_domain_rates(rates):
+    """Définit les débits par domaine, ex. {"www.google.com": 2.0}"""
+    with _domain_lock:
+        _domain_rates.update(rates)
+        _domain_limiters.clear()
+
+
+def get_domain_limiter(url):
+    """Retourne le limiteur du domaine de `url`, ou None si le domaine n'est pas limité"""
+    domain = urlsplit(url).hostname or ""
+    with _domain_lock:
+        limiter = _domain_limiters.get(domain)
+        if limiter is None and domain in _domain_rates:
+            limiter = _domain_limiters[domain] = TokenBucket(_domain_rates[domain], capacity=1)
+        return limiter
@@ -0,0 +1,121 @@
+"""
+Élément publié (schéma fixe de parse_item) et sérialisation JSON rapide.
+
+L'encodeur est orjson, sinon msgspec, sinon le module json de la
+bibliothèque standard ; tous produisent du JSON compact en UTF-8.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    ENCODER = "orjson"
+    _dumps = orjson.dumps
+    loads = orjson.loads
+elif msgspec is not None:
+    ENCODER = "msgspec"
+    _dumps = msgspec.json.encode
+    loads = msgspec.json.decode
+else:
+    ENCODER = "json"
+    loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Record:
+    """
+    Payload de parse_item : attributs fixes (pas de dictionnaire par
+    instance), sérialisé au plus une fois. Les octets de encode() servent au
+    message Kafka, au document Elasticsearch et aux fichiers JSON Lines.
+
+    `derived` reçoit les champs dérivés du post-traitement (utils.postprocess),
+    qui complètent ou remplacent les champs de parse_item ; `location`
+    remplace `coordinates`. Il est renseigné une fois, avant le premier
+    encode() ; les champs de parse_item ne sont pas modifiés.
+
+    Se lit comme un dictionnaire (record["company_RC"], get(), dict(record)),
+    champs dérivés compris.
+    """
+
+    FIELDS = (
+        "company_name", "company_RC", "address", "email", "phone_number", "language",
+        "coordinates", "website", "social_networks", "rating", "review_count", "cuisine", "price_range",
+    )
+    __slots__ = FIELDS + ("derived", "_encoded")
+
+    def __init__(self, company_name, company_RC, address, email, phone_number, language, coordinates,
+                 website=None, social_networks=None, rating=None, review_count=None, cuisine=None,
+                 price_range=None):
+        self.company_name = company_name
+        self.company_RC = company_RC
+        self.address = address
+        self.email = email
+        self.phone_number = phone_number
+        self.language = language
+        self.coordinates = coordinates
+        self.website = website
+        self.social_networks = social_networks if social_networks is not None else []
+        self.rating = rating
+        self.review_count = review_count
+        self.cuisine = cuisine
+        self.price_range = price_range
+        self.derived = None
+        self._encoded = None
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __getitem__(self, key):
+        if self.derived:
+            if key in self.derived:
+                return self.derived[key]
+            if key == "coordinates" and "location" in self.derived:
+                raise KeyError(key)
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self, derived=True):
+        """Dictionnaire du payload, avec ou sans les champs dérivés"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        if derived and self.derived:
+            if "location" in self.derived:
+                del data["coordinates"]
+            data.update(self.derived)
+        return data
+
+    def encode(self) -> bytes:
+        """JSON compact en UTF-8, calculé au premier appel"""
+        if self._encoded is None:
+            self._encoded = _dumps(self.to_dict())
+        return self._encoded
+
+    def __repr__(self):
+        return f"Record(company_RC={self.company_RC!r}, company_name={self.company_name!r})"
+
+
+def encode(payload) -> bytes:
+    """Sérialise un Record (octets mis en cache) ou un dictionnaire"""
+    if isinstance(payload, Record):
+        return payload.encode()
+    return _dumps(payload)
+
+
+def as_dict(payload, derived=True):
+    """Dictionnaire d'un Record (avec ou sans les champs dérivés), ou le payload tel quel"""
+    return payload.to_dict(derived) if isinstance(payload, Record) else payload
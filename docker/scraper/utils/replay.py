@@ -0,0 +1,132 @@
+"""
+Republication des fichiers de sortie sans nouveau scraping (reconstruction
+des index après un changement de mapping Logstash/Vector).
+
+    python -m utils.replay "output/*.json" "output/*.jsonl*"
+    python -m utils.replay "output/Tanger_*.json" --rate 2000 --batch 5000
+    python -m utils.replay "output/*.json" --sink elasticsearch
+
+Les fichiers sont lus en flux (tableaux JSON, JSON Lines éventuellement
+compressés en .gz/.zst, instantanés Parquet), du plus récent au plus
+ancien : pour un même company_RC ou un même lieu, seule la version la plus
+récente est republiée.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+from utils.output import iter_records
+from utils.postprocess import configure_postprocess, prepare_batch, strip_derived
+from utils.ratelimit import TokenBucket
+from utils.sender import close_sink, configure_sink, flush_sink, send_to_sink
+
+logger = logging.getLogger(__name__)
+
+
+def record_keys(record):
+    """Clés de déduplication : company_RC, et le lieu (nom + coordonnées)"""
+    keys = []
+    if record.get("company_RC"):
+        keys.append(f"rc:{record['company_RC']}")
+    coordinates = record.get("coordinates") or {}
+    if coordinates.get("lat") or coordinates.get("lang"):
+        keys.append(f"place:{record.get('company_name')}:{coordinates.get('lat')},{coordinates.get('lang')}")
+    return keys
+
+
+def iter_unique(paths):
+    """Payloads de parse_item des fichiers (les plus récents d'abord), sans doublons"""
+    seen = set()
+    duplicates = 0
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        for record in iter_records(path):
+            record = strip_derived(record)
+            keys = record_keys(record)
+            if any(key in seen for key in keys):
+                duplicates += 1
+                continue
+            seen.update(keys)
+            yield record
+    logger.info(f"{duplicates} doublons ignorés")
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def replay(paths, rate=0, batch=1000):
+    """
+    Republie les éléments uniques de `paths` vers la destination configurée,
+    au plus `rate` éléments/s (0 : sans limite). Les acquittements sont
+    attendus tous les `batch` éléments. Retourne (publiés, échecs).
+    """
+    limiter = TokenBucket(rate, capacity=max(1, min(batch, int(rate) or 1)))
+    delivered = failed = pending = 0
+
+    def wait_batch():
+        nonlocal delivered, failed, pending
+        report = flush_sink("replay")
+        delivered += report.delivered
+        failed += report.failed
+        pending = 0
+        logger.info(f"{delivered} éléments republiés, {failed} échecs")
+
+    for records in _chunks(iter_unique(paths), min(batch, 500)):
+        # Champs dérivés recalculés (ceux des fichiers ont été retirés par iter_unique)
+        for record in prepare_batch(records):
+            limiter.acquire()
+            send_to_sink(record, city="replay")
+            pending += 1
+            if pending >= batch:
+                wait_batch()
+    wait_batch()
+    return delivered, failed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Republication des fichiers output/*.json[l]")
+    parser.add_argument("files", nargs="+", help="Fichiers ou motifs glob")
+    parser.add_argument("--rate", type=float, default=0, help="Éléments publiés par seconde (0 : sans limite)")
+    parser.add_argument("--batch", type=int, default=1000, help="Éléments entre deux attentes d'acquittement")
+    parser.add_argument("--sink", choices=["kafka", "elasticsearch"], default=os.getenv("SINK", "kafka"),
+                        help="Destination : Kafka (pipeline Logstash/Vector) ou écriture directe Elasticsearch _bulk")
+    parser.add_argument("--no-postprocess", action="store_true",
+                        help="Republier les payloads bruts, sans les champs dérivés (calculés par Logstash/Vector)")
+    parser.add_argument("--es-url", default=os.getenv("ES_URL", "http://elasticsearch:9200"))
+    parser.add_argument("--es-index", default=os.getenv("ES_INDEX", "business-%Y.%m.%d"))
+    args = parser.parse_args()
+
+    if args.no_postprocess:
+        configure_postprocess(False)
+    paths = [path for pattern in args.files for path in sorted(glob.glob(pattern))]
+    if not paths:
+        logger.error("Aucun fichier à republier")
+        return 1
+    if args.sink == "elasticsearch":
+        configure_sink("elasticsearch", url=args.es_url, index=args.es_index, batch_size=min(args.batch, 1000))
+    else:
+        # Gros lots compressés : le débit prime sur la latence
+        configure_sink("kafka", pipelined=True, linger_ms=100, batch_size=1024 * 1024)
+    try:
+        delivered, failed = replay(paths, rate=args.rate, batch=args.batch)
+    finally:
+        close_sink()
+    logger.info(f"Republication terminée : {delivered} éléments depuis {len(paths)} fichiers, {failed} échecs")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
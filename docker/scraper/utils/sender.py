@@ -1,80 +1,422 @@
-import json
+import concurrent.futures
 import logging
-from kafka import KafkaProducer
-from kafka.errors import KafkaError
+import os
+import threading
+import time
+from datetime import datetime
+from utils.http import get_http_session
+from utils.metrics import KAFKA_DELIVERY, timed
+from utils.record import Record, encode
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
+
+class DeliveryReport:
+    """
+    Rapport de livraison des messages Kafka pour une ville (un job).
+    `confirmed` : company_RC des éléments dont l'acquittement a été reçu ;
+    un élément encore en attente au flush (délai dépassé) n'y figure pas.
+    """
+
+    def __init__(self, city):
+        self.city = city
+        self.queued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.errors = []
+        self.confirmed = set()
+        self._lock = threading.Lock()
+
+    def on_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def on_delivered(self, record_metadata=None, data=None):
+        with self._lock:
+            self.delivered += 1
+            if isinstance(data, (dict, Record)) and data.get("company_RC"):
+                self.confirmed.add(data["company_RC"])
+
+    def on_failed(self, error, data=None):
+        with self._lock:
+            self.failed += 1
+            company_rc = data.get("company_RC") if isinstance(data, (dict, Record)) else None
+            self.errors.append({"company_RC": company_rc, "error": str(error)})
+
+    @property
+    def pending(self):
+        return self.queued - self.delivered - self.failed
+
+    def __repr__(self):
+        return (
+            f"DeliveryReport(city={self.city!r}, queued={self.queued}, "
+            f"delivered={self.delivered}, failed={self.failed})"
+        )
+
+
 class KafkaSender:
     """Classe pour envoyer des données à Kafka"""
-    
-    def __init__(self, bootstrap_servers='kafka:9092', topic='scraper-data'):
-        """Initialise le producteur Kafka"""
+
+    def __init__(self, bootstrap_servers='kafka:9092', topic='scraper-data',
+                 pipelined=False, linger_ms=50, batch_size=64 * 1024,
+                 compression_type='gzip', delivery_timeout=60):
+        """
+        Initialise le producteur Kafka.
+
+        En mode `pipelined`, send() n'attend plus l'acquittement du broker :
+        les messages sont mis en file et regroupés par le producteur
+        (linger_ms / batch_size / compression_type), les résultats remontent
+        par callbacks dans un DeliveryReport par job (`report_key`, la ville
+        par défaut), et l'attente se fait uniquement dans flush() (fin de
+        job) ou close().
+        """
         self.topic = topic
         self.producer = None
         self.bootstrap_servers = bootstrap_servers
+        self.pipelined = pipelined
+        self.linger_ms = linger_ms
+        self.batch_size = batch_size
+        self.compression_type = compression_type
+        self.delivery_timeout = delivery_timeout
+        self._reports = {}
+        self._reports_lock = threading.Lock()
         self._connect()
-    
+
     def _connect(self):
         """Établit la connexion avec le broker Kafka"""
-        try:
-            self.producer = KafkaProducer(
-                bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                acks='all',
-                retries=3
+        options = {
+            'bootstrap_servers': self.bootstrap_servers,
+            'value_serializer': encode,
+            'acks': 'all',
+            'retries': 3,
+        }
+        if self.pipelined:
+            options.update(
+                linger_ms=self.linger_ms,
+                batch_size=self.batch_size,
+                compression_type=self.compression_type,
             )
-            logger.info(f"Connecté au broker Kafka: {self.bootstrap_servers}")
+        try:
+            # Client Kafka importé à la connexion, pas au démarrage du processus
+            from kafka import KafkaProducer
+            self.producer = KafkaProducer(**options)
+            mode = "pipeliné" if self.pipelined else "synchrone"
+            logger.info(f"Connecté au broker Kafka: {self.bootstrap_servers} (mode {mode})")
         except Exception as e:
             logger.error(f"Erreur de connexion à Kafka: {str(e)}")
             self.producer = None
-    
-    def send(self, data):
-        """Envoie les données à Kafka"""
+
+    def _get_report(self, key, city):
+        with self._reports_lock:
+            report = self._reports.get(key)
+            if report is None:
+                report = self._reports[key] = DeliveryReport(city)
+            return report
+
+    def send(self, data, city=None, report_key=None):
+        """
+        Envoie les données à Kafka.
+
+        En mode synchrone, retourne True une fois le message acquitté. En mode
+        pipeliné, retourne True dès que le message est mis en file ; le
+        résultat réel est consigné dans le rapport de livraison du job
+        `report_key` (par défaut `city`).
+        """
+        report = self._get_report(report_key or city, city)
         if not self.producer:
             logger.error("Producteur Kafka non disponible")
+            report.on_queued()
+            report.on_failed("Producteur Kafka non disponible", data)
             return False
-        
+
+        from kafka.errors import KafkaError
+        queued_at = time.monotonic()
         try:
-            future = self.producer.send(self.topic, data)
-            # Attendre la confirmation d'envoi (optionnel)
+            with timed("kafka_send"):
+                future = self.producer.send(self.topic, data)
+            report.on_queued()
+        except Exception as e:
+            logger.error(f"Exception lors de l'envoi à Kafka: {str(e)}")
+            report.on_queued()
+            report.on_failed(e, data)
+            return False
+
+        if self.pipelined:
+            future.add_callback(self._on_delivered, report, queued_at, data)
+            future.add_errback(self._on_send_error, report, data)
+            return True
+
+        try:
+            # Attendre la confirmation d'envoi
             record_metadata = future.get(timeout=10)
+            KAFKA_DELIVERY.observe(time.monotonic() - queued_at)
             logger.debug(f"Message envoyé à {record_metadata.topic}, partition {record_metadata.partition}, offset {record_metadata.offset}")
+            report.on_delivered(record_metadata, data)
             return True
         except KafkaError as e:
             logger.error(f"Erreur lors de l'envoi à Kafka: {str(e)}")
+            report.on_failed(e, data)
             return False
         except Exception as e:
             logger.error(f"Exception lors de l'envoi à Kafka: {str(e)}")
+            report.on_failed(e, data)
             return False
-    
+
+    @staticmethod
+    def _on_delivered(report, queued_at, data, record_metadata):
+        KAFKA_DELIVERY.observe(time.monotonic() - queued_at)
+        report.on_delivered(record_metadata, data)
+
+    @staticmethod
+    def _on_send_error(report, data, error):
+        logger.error(f"Erreur lors de l'envoi à Kafka: {str(error)}")
+        report.on_failed(error, data)
+
+    def flush(self, city=None, report_key=None):
+        """
+        Attend la livraison des messages en file et retourne le rapport de
+        livraison du job `report_key` (par défaut `city`), qui est ensuite
+        réinitialisé.
+        """
+        if self.producer:
+            from kafka.errors import KafkaError
+            try:
+                self.producer.flush(timeout=self.delivery_timeout)
+            except KafkaError as e:
+                logger.error(f"Délai dépassé lors du flush Kafka: {str(e)}")
+        with self._reports_lock:
+            return self._reports.pop(report_key or city, None) or DeliveryReport(city)
+
     def close(self):
         """Ferme la connexion au producteur Kafka"""
         if self.producer:
             self.producer.flush()
             self.producer.close()
             logger.info("Connexion au producteur Kafka fermée")
+        with self._reports_lock:
+            for report in self._reports.values():
+                if report.failed or report.pending:
+                    logger.warning(f"Livraison incomplète à la fermeture: {report}")
+            self._reports.clear()
+
+class ElasticsearchBulkSink:
+    """
+    Écriture directe dans Elasticsearch par l'API `_bulk`, sans passer par
+    Kafka et Logstash (rechargements et backfills).
+
+    Même interface que KafkaSender en mode pipeliné : send() met le document
+    en lot et retourne aussitôt, jusqu'à `max_in_flight` lots sont envoyés en
+    parallèle, et flush() attend les lots du job (`report_key`, la ville par
+    défaut) et retourne son DeliveryReport. Seuls les documents rejetés avec une erreur temporaire
+    (429, 5xx) sont renvoyés, jusqu'à `max_retries` fois.
+    """
+
+    pipelined = True
+    RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, url='http://elasticsearch:9200', index='business-%Y.%m.%d',
+                 batch_size=500, max_in_flight=4, max_retries=3, timeout=60):
+        self.url = url.rstrip('/')
+        # Même nommage et même _id que la sortie Logstash (business-AAAA.MM.JJ, company_RC)
+        self.index = index
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = get_http_session("elasticsearch", pool_size=max_in_flight)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="es-bulk")
+        # Plafonne les lots en attente : send() bloque quand max_in_flight lots sont en cours
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._buffers = {}
+        self._futures = {}
+        self._reports = {}
+        self._lock = threading.Lock()
+        logger.info(f"Écriture directe dans Elasticsearch: {self.url} (lots de {batch_size}, {max_in_flight} en parallèle)")
+
+    def _get_report(self, key, city):
+        report = self._reports.get(key)
+        if report is None:
+            report = self._reports[key] = DeliveryReport(city)
+        return report
+
+    def send(self, data, city=None, report_key=None):
+        """Ajoute un document au lot du job `report_key` (par défaut `city`) ; retourne True une fois mis en lot"""
+        key = report_key or city
+        with self._lock:
+            report = self._get_report(key, city)
+            report.on_queued()
+            buffer = self._buffers.setdefault(key, [])
+            buffer.append(data)
+            if len(buffer) < self.batch_size:
+                return True
+            batch = self._buffers.pop(key)
+        self._submit(batch, report, key)
+        return True
+
+    def _submit(self, batch, report, key):
+        self._slots.acquire()
+        future = self._executor.submit(self._write_batch, batch, report)
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures.setdefault(key, []).append(future)
+
+    def _bulk_body(self, batch):
+        index = datetime.now().strftime(self.index)
+        lines = []
+        for doc in batch:
+            action = {"_index": index}
+            if doc.get("company_RC"):
+                action["_id"] = doc["company_RC"]
+            lines.append(encode({"index": action}))
+            lines.append(encode(doc))
+        return b"\n".join(lines) + b"\n"
+
+    def _write_batch(self, batch, report):
+        """
+        Envoie un lot, puis renvoie uniquement les documents en erreur
+        temporaire. Seuls les statuts RETRYABLE_STATUSES et les erreurs de
+        connexion ou de délai entraînent un nouvel essai du lot ; tout autre
+        refus (mapping 400, authentification 401/403, lot trop gros 413...)
+        fait échouer le lot aussitôt.
+        """
+        from requests.exceptions import ConnectionError, Timeout
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(min(30, 2 ** attempt))
+            try:
+                with timed("es_bulk"):
+                    resp = self.session.post(
+                        f"{self.url}/_bulk",
+                        data=self._bulk_body(batch),
+                        headers={"Content-Type": "application/x-ndjson"},
+                        timeout=self.timeout,
+                    )
+            except (ConnectionError, Timeout) as e:
+                logger.warning(f"Échec du lot Elasticsearch ({len(batch)} documents, tentative {attempt + 1}): {e}")
+                last_error = e
+                continue
+            except Exception as e:
+                self._fail_batch(batch, report, e)
+                return
+            if resp.status_code in self.RETRYABLE_STATUSES:
+                logger.warning(f"Elasticsearch indisponible (HTTP {resp.status_code}), "
+                               f"lot de {len(batch)} documents, tentative {attempt + 1}")
+                last_error = f"Elasticsearch indisponible (HTTP {resp.status_code})"
+                continue
+            if resp.status_code >= 300:
+                self._fail_batch(batch, report, f"HTTP {resp.status_code}: {resp.text[:500]}")
+                return
+            try:
+                items = resp.json().get("items", [])
+            except ValueError as e:
+                self._fail_batch(batch, report, f"Réponse _bulk illisible : {e}")
+                return
+
+            if len(items) < len(batch):
+                # Réponse tronquée : les documents sans résultat sont comptés en échec
+                logger.error(f"Réponse _bulk incomplète : {len(items)} résultats pour {len(batch)} documents")
+                for doc in batch[len(items):]:
+                    report.on_failed("Aucun résultat dans la réponse _bulk", doc)
+            retry = []
+            for doc, item in zip(batch, items):
+                result = item.get("index", {})
+                status = result.get("status", 500)
+                if status < 300:
+                    report.on_delivered(result, doc)
+                elif status in self.RETRYABLE_STATUSES and attempt < self.max_retries:
+                    retry.append(doc)
+                else:
+                    report.on_failed(result.get("error") or f"HTTP {status}", doc)
+            if not retry:
+                return
+            logger.info(f"{len(retry)}/{len(batch)} documents à renvoyer à Elasticsearch")
+            batch = retry
+            last_error = None
+
+        for doc in batch:
+            report.on_failed(last_error or "Nombre maximal de tentatives atteint", doc)
+
+    @staticmethod
+    def _fail_batch(batch, report, error):
+        """Lot refusé sans nouvel essai possible : tous ses documents sont en échec"""
+        logger.error(f"Lot Elasticsearch rejeté ({len(batch)} documents): {error}")
+        for doc in batch:
+            report.on_failed(error, doc)
+
+    def flush(self, city=None, report_key=None):
+        """Envoie le lot en cours du job, attend ses lots et retourne son rapport"""
+        key = report_key or city
+        with self._lock:
+            report = self._get_report(key, city)
+            batch = self._buffers.pop(key, None)
+        if batch:
+            self._submit(batch, report, key)
+        with self._lock:
+            futures = self._futures.pop(key, [])
+        concurrent.futures.wait(futures)
+        with self._lock:
+            return self._reports.pop(key, None) or DeliveryReport(city)
+
+    def close(self):
+        with self._lock:
+            keys = list(self._buffers) + list(self._futures)
+            cities = {key: self._reports[key].city for key in keys if key in self._reports}
+        for key in dict.fromkeys(keys):
+            report = self.flush(cities.get(key, key), report_key=key)
+            if report.failed:
+                logger.warning(f"Livraison incomplète à la fermeture: {report}")
+        self._executor.shutdown(wait=True)
+        logger.info("Écriture Elasticsearch terminée")
+
+# Destinations disponibles (--sink ou variable SINK)
+SINKS = {
+    "kafka": KafkaSender,
+    "elasticsearch": ElasticsearchBulkSink,
+}
+
+# Instance globale de la destination
+sink = None
+_sink_lock = threading.Lock()
+# Destination et options appliquées à la création de l'instance globale
+sink_backend = os.getenv("SINK", "kafka")
+sink_options = {}
+
+def configure_sink(backend=None, **options):
+    """Choisit la destination globale et ses options (avant sa création)"""
+    global sink_backend
+    if backend:
+        if backend not in SINKS:
+            raise ValueError(f"Destination inconnue : {backend}")
+        sink_backend = backend
+    sink_options.update(options)
+
+def get_sink():
+    """Retourne la destination globale, en la créant si nécessaire"""
+    global sink
+    with _sink_lock:
+        if sink is None:
+            sink = SINKS[sink_backend](**sink_options)
+        return sink
+
+def send_to_sink(data, city=None, report_key=None):
+    """Envoie les données à la destination configurée (rapport du job `report_key`, par défaut `city`)"""
+    return get_sink().send(data, city=city, report_key=report_key)
+
+def flush_sink(city=None, report_key=None):
+    """Attend la livraison des données d'un job (par défaut d'une ville) et retourne son rapport"""
+    return get_sink().flush(city, report_key=report_key)
+
+def close_sink():
+    """Ferme la destination globale"""
+    global sink
+    with _sink_lock:
+        current, sink = sink, None
+    if current:
+        current.close()
 
-# Instance globale du sender
-kafka_sender = None
-
-def get_kafka_sender():
-    """Retourne l'instance du sender Kafka, en la créant si nécessaire"""
-    global kafka_sender
-    if kafka_sender is None:
-        kafka_sender = KafkaSender()
-    return kafka_sender
-
-def send_to_kafka(data):
-    """Envoie les données à Kafka"""
-    sender = get_kafka_sender()
-    return sender.send(data)
-
-def close_kafka_sender():
-    """Ferme la connexion au sender Kafka"""
-    global kafka_sender
-    if kafka_sender:
-        kafka_sender.close()
-        kafka_sender = None
-            
\ No newline at end of file
+# Anciens noms, destination Kafka par défaut
+configure_kafka_sender = configure_sink
+get_kafka_sender = get_sink
+send_to_kafka = send_to_sink
+flush_kafka_sender = flush_sink
+close_kafka_sender = close_sink
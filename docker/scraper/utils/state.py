@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from utils.places import place_key
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.getenv("STATE_PATH", "output/state.sqlite")
+# Champs de la carte Maps dont la modification déclenche un nouvel envoi
+FINGERPRINT_FIELDS = ("name", "rating", "review_count", "price_range", "cuisine")
+# Champs issus de l'enrichissement, réutilisés tant qu'ils sont assez récents
+ENRICHMENT_FIELDS = ("telephone", "site_web", "reseaux_sociaux")
+
+
+def fingerprint(item):
+    """Empreinte des champs de la carte Maps"""
+    values = [item.get(field) for field in FINGERPRINT_FIELDS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    """
+    État local des lieux déjà publiés (SQLite), indexé par clé de lieu :
+    empreinte de la carte, company_RC, adresse et données d'enrichissement
+    avec leur date. Sert au scraping incrémental.
+    """
+
+    def __init__(self, path=STATE_PATH, refresh_age=30 * 86400):
+        self.path = path
+        self.refresh_age = refresh_age
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS places ("
+            " key TEXT PRIMARY KEY,"
+            " fingerprint TEXT,"
+            " company_rc TEXT,"
+            " data TEXT,"
+            " enriched_at REAL,"
+            " published_at REAL)"
+        )
+
+    def get(self, key):
+        """Retourne l'état enregistré d'un lieu, ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, company_rc, data, enriched_at FROM places WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "fingerprint": row[0],
+            "company_RC": row[1],
+            "data": json.loads(row[2]),
+            "enriched_at": row[3],
+        }
+
+    @staticmethod
+    def snapshot(item):
+        """Copie réduite d'un élément, suffisante pour commit() une fois la livraison confirmée"""
+        fields = ("url", "latitude", "longitude", "address", "_enriched_at") + FINGERPRINT_FIELDS + ENRICHMENT_FIELDS
+        return {field: item.get(field) for field in fields}
+
+    def commit(self, item, company_rc):
+        """Enregistre un lieu publié avec succès"""
+        key = place_key(item)
+        if not key:
+            return
+        data = {"address": item.get("address")}
+        data.update({field: item.get(field) for field in ENRICHMENT_FIELDS})
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO places (key, fingerprint, company_rc, data, enriched_at, published_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, fingerprint(item), company_rc, json.dumps(data, ensure_ascii=False),
+                 item.get("_enriched_at") or now, now),
+            )
+
+    def filter_changes(self, restaurants):
+        """
+        Ne renvoie que les lieux nouveaux ou modifiés depuis la dernière
+        publication. Un lieu modifié dont l'enrichissement est encore récent
+        reprend l'adresse et les données enrichies enregistrées (marqué
+        `_enriched_at`) au lieu d'être géocodé et enrichi de nouveau.
+        """
+        now = time.time()
+        new = changed = unchanged = 0
+        for restaurant in restaurants:
+            key = place_key(restaurant)
+            state = self.get(key) if key else None
+            if state is None:
+                new += 1
+                yield restaurant
+                continue
+
+            restaurant["company_RC"] = state["company_RC"]
+            fresh = state["enriched_at"] and now - state["enriched_at"] < self.refresh_age
+            if fresh and state["fingerprint"] == fingerprint(restaurant):
+                unchanged += 1
+                continue
+
+            changed += 1
+            if fresh:
+                restaurant.update(state["data"])
+                restaurant["_enriched_at"] = state["enriched_at"]
+            yield restaurant
+
+        logger.info(f"Scraping incrémental : {new} nouveaux, {changed} modifiés ou à rafraîchir, {unchanged} inchangés ignorés")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Instance globale (None tant que le mode incrémental n'est pas activé)
+state_store = None
+state_store_options = None
+_state_store_lock = threading.Lock()
+
+def configure_state_store(**options):
+    """Active le mode incrémental avec les options données (path, refresh_age)"""
+    global state_store_options
+    state_store_options = options
+
+def get_state_store():
+    """Retourne l'état local si le mode incrémental est activé, sinon None"""
+    global state_store
+    if state_store_options is None:
+        return None
+    with _state_store_lock:
+        if state_store is None:
+            state_store = StateStore(**state_store_options)
+        return state_store
@@ -0,0 +1,94 @@
+"""
+Découpage géographique d'une ville en tuiles de recherche Google Maps.
+
+La liste de résultats d'une recherche Maps est plafonnée : une grande ville
+recherchée d'un bloc est mal couverte. Chaque tuile de la boîte englobante
+de la ville (`bbox` dans config/villes_maroc.json) devient une recherche
+distincte, centrée sur la tuile au zoom qui la couvre ; les tuiles trop
+denses sont redécoupées en quatre.
+"""
+import math
+import os
+
+# Côté des tuiles de la grille initiale (km)
+TILE_SIZE_KM = float(os.getenv("TILE_SIZE_KM", "3"))
+# Nombre maximal de redécoupages d'une tuile dense
+TILE_MAX_DEPTH = int(os.getenv("TILE_MAX_DEPTH", "2"))
+# Nombre de résultats à partir duquel une tuile est considérée comme plafonnée
+TILE_DENSE_RESULTS = int(os.getenv("TILE_DENSE_RESULTS", "100"))
+# Taille approximative de la fenêtre du navigateur (pixels), pour le choix du zoom
+VIEWPORT_WIDTH = int(os.getenv("TILE_VIEWPORT_WIDTH", "1280"))
+VIEWPORT_HEIGHT = int(os.getenv("TILE_VIEWPORT_HEIGHT", "720"))
+
+KM_PER_DEGREE = 111.32
+
+
+class Tile:
+    """Rectangle géographique (degrés) et sa profondeur de redécoupage"""
+
+    def __init__(self, south, west, north, east, depth=0):
+        self.south = south
+        self.west = west
+        self.north = north
+        self.east = east
+        self.depth = depth
+
+    @property
+    def center(self):
+        return (self.south + self.north) / 2, (self.west + self.east) / 2
+
+    @property
+    def zoom(self):
+        """Zoom Maps le plus fort auquel la fenêtre couvre toute la tuile"""
+        lat, _ = self.center
+        # Projection Web Mercator : 256 × 2^zoom pixels pour 360° de longitude
+        zoom_lon = math.log2(VIEWPORT_WIDTH * 360 / (256 * (self.east - self.west)))
+        zoom_lat = math.log2(VIEWPORT_HEIGHT * 360 * math.cos(math.radians(lat)) / (256 * (self.north - self.south)))
+        return max(3, min(21, math.floor(min(zoom_lon, zoom_lat))))
+
+    def split(self):
+        """Les quatre quarts de la tuile"""
+        lat, lon = self.center
+        depth = self.depth + 1
+        return [
+            Tile(self.south, self.west, lat, lon, depth),
+            Tile(self.south, lon, lat, self.east, depth),
+            Tile(lat, self.west, self.north, lon, depth),
+            Tile(lat, lon, self.north, self.east, depth),
+        ]
+
+    def url(self, template):
+        """URL de recherche centrée sur la tuile (`template` avec {lat}, {lon}, {zoom})"""
+        lat, lon = self.center
+        return template.format(lat=f"{lat:.6f}", lon=f"{lon:.6f}", zoom=self.zoom)
+
+    def __repr__(self):
+        return (f"Tile({self.south:.4f},{self.west:.4f} → {self.north:.4f},{self.east:.4f}, "
+                f"zoom={self.zoom}, depth={self.depth})")
+
+
+def grid(bbox, size_km=TILE_SIZE_KM):
+    """
+    Tuiles d'environ `size_km` de côté couvrant `bbox`
+    ({"south", "west", "north", "east"} en degrés).
+    """
+    south, west, north, east = bbox["south"], bbox["west"], bbox["north"], bbox["east"]
+    if south >= north or west >= east:
+        raise ValueError(f"Boîte englobante invalide : {bbox}")
+    lat_km = (north - south) * KM_PER_DEGREE
+    lon_km = (east - west) * KM_PER_DEGREE * math.cos(math.radians((south + north) / 2))
+    rows = max(1, math.ceil(lat_km / size_km))
+    cols = max(1, math.ceil(lon_km / size_km))
+    lat_step = (north - south) / rows
+    lon_step = (east - west) / cols
+    return [
+        Tile(south + row * lat_step, west + col * lon_step,
+             south + (row + 1) * lat_step, west + (col + 1) * lon_step)
+        for row in range(rows)
+        for col in range(cols)
+    ]
+
+
+def is_dense(results, stop_reason=None):
+    """Vrai si la liste de la tuile a probablement été tronquée (plafond ou budget de défilement)"""
+    return results >= TILE_DENSE_RESULTS or stop_reason == "budget de temps épuisé"